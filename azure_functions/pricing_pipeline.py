@@ -24,6 +24,18 @@ except ImportError:
     raise
 
 
+# Scryfall price keys collected (each stored as its own price_type), with
+# the currency and finish they stand for
+PRICE_TYPES = (
+    ('usd', 'usd', 'nonfoil'),
+    ('usd_foil', 'usd', 'foil'),
+    ('usd_etched', 'usd', 'etched'),
+    ('eur', 'eur', 'nonfoil'),
+    ('eur_foil', 'eur', 'foil'),
+    ('tix', 'tix', 'nonfoil'),
+)
+
+
 class ScryfallBulkCollector:
     """
     Efficient bulk pricing collection using Scryfall's /cards/collection endpoint
@@ -74,19 +86,10 @@ class ScryfallBulkCollector:
         card_name = card_data.get('name', 'Unknown')
         prices = card_data.get('prices', {})
         
-        price_mappings = {
-            'usd': 'usd',
-            'usd_foil': 'usd_foil', 
-            'usd_etched': 'usd_etched',
-            'eur': 'eur',
-            'eur_foil': 'eur_foil',
-            'tix': 'tix'
-        }
-        
-        for price_key, price_type in price_mappings.items():
+        for price_key, currency, finish in PRICE_TYPES:
             price_value = prices.get(price_key)
             
-            if price_value and price_value != "":
+            if price_value:
                 try:
                     price_float = float(price_value)
                     
@@ -94,10 +97,10 @@ class ScryfallBulkCollector:
                         'card_name': card_name,
                         'scryfall_id': card_id,
                         'date': target_date,
-                        'price_type': price_type,
+                        'price_type': price_key,
                         'price_value': price_float,
-                        'currency': price_key.split('_')[0],
-                        'finish': 'foil' if 'foil' in price_key else 'etched' if 'etched' in price_key else 'nonfoil',
+                        'currency': currency,
+                        'finish': finish,
                         'tcgplayer_id': card_data.get('tcgplayer_id'),
                         'cardmarket_id': card_data.get('cardmarket_id'),
                         'collected_at': datetime.now(timezone.utc),
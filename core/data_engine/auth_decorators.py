@@ -6,7 +6,7 @@ and managing user sessions.
 """
 
 import functools
-from flask import session, request, jsonify, redirect, url_for, flash
+from flask import session, request, jsonify, redirect, url_for, flash, make_response
 from core.data_engine.user_manager import UserManager
 
 # Create a global user manager instance
@@ -38,7 +38,8 @@ def ai_query_required(f):
             return redirect(url_for('login'))
         
         user_id = session['user_id']
-        query_check = user_manager.can_make_ai_query(user_id)
+        # Check the quota and count this query in a single atomic update
+        query_check = user_manager.reserve_ai_query(user_id)
         
         if not query_check['allowed']:
             if request.is_json:
@@ -53,7 +54,15 @@ def ai_query_required(f):
         # Store remaining queries in request context for display
         request.remaining_queries = query_check.get('remaining_queries', 0)
         
-        return f(*args, **kwargs)
+        # Requests that fail don't use up the user's quota
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            user_manager.release_ai_query(user_id)
+            raise
+        if response.status_code >= 400:
+            user_manager.release_ai_query(user_id)
+        return response
     return decorated_function
 
 
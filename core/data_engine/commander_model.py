@@ -8,6 +8,22 @@ import re
 from typing import List, Dict, Set, Optional, Tuple, Any
 from dataclasses import dataclass, field
 from enum import Enum
+from functools import cached_property
+
+
+# Bit assigned to each color symbol for ColorIdentity masks.  Anything outside
+# WUBRG (stray symbols from rules-text parsing) is given its own higher bit on
+# first sight so subset checks on masks stay exact.
+COLOR_BITS: Dict[str, int] = {'W': 1, 'U': 2, 'B': 4, 'R': 8, 'G': 16}
+_symbol_bits: Dict[str, int] = dict(COLOR_BITS)
+
+
+def _symbol_bit(symbol: str) -> int:
+    bit = _symbol_bits.get(symbol)
+    if bit is None:
+        bit = 1 << len(_symbol_bits)
+        _symbol_bits[symbol] = bit
+    return bit
 
 
 class CommanderArchetype(Enum):
@@ -70,9 +86,17 @@ class ColorIdentity:
         
         return cls(colors)
     
+    @cached_property
+    def _mask(self) -> int:
+        """Bitmask of the colors, computed once (colors are not mutated after construction)."""
+        mask = 0
+        for color in self.colors:
+            mask |= _symbol_bit(color)
+        return mask
+
     def contains(self, other: 'ColorIdentity') -> bool:
         """Check if this color identity contains another (for deck legality)."""
-        return other.colors.issubset(self.colors)
+        return (other._mask & ~self._mask) == 0
     
     def is_colorless(self) -> bool:
         """Check if this is a colorless identity."""
@@ -194,10 +218,13 @@ class CommanderCard:
             if match:
                 partner_with = match.group(1).strip()
         
-        # Create color identity
-        color_identity = ColorIdentity.from_mana_cost_and_rules_text(
-            card_data.get('mana_cost', ''), oracle_text
-        )
+        # Create color identity (Scryfall's color_identity when present)
+        if card_data.get('color_identity') is not None:
+            color_identity = ColorIdentity.from_color_list(card_data['color_identity'])
+        else:
+            color_identity = ColorIdentity.from_mana_cost_and_rules_text(
+                card_data.get('mana_cost', ''), oracle_text
+            )
         
         return cls(
             name=card_data.get('name', ''),
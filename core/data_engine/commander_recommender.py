@@ -11,11 +11,17 @@ Features:
 """
 import sys
 import os
+import re
+import json
+import asyncio
 import logging
+import functools
 from typing import List, Dict, Set, Optional, Tuple, Any
 from dataclasses import dataclass
 import random
-from collections import defaultdict
+import threading
+import numpy as np
+from collections import defaultdict, Counter
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import multiprocessing
 
@@ -23,8 +29,8 @@ import multiprocessing
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from data_engine import cosmos_driver
-from data_engine.cosmos_driver import get_mongo_client, get_collection
-from data_engine.commander_model import CommanderCard, CommanderDeck, CommanderAnalyzer, CommanderArchetype, ColorIdentity
+from data_engine.cosmos_driver import get_shared_mongo_client, get_collection
+from data_engine.commander_model import CommanderCard, CommanderDeck, CommanderAnalyzer, CommanderArchetype, ColorIdentity, COLOR_BITS
 from data_engine.synergy_analyzer import SynergyAnalyzer, SynergyScore
 from data_engine.perplexity_client import PerplexityClient
 
@@ -43,8 +49,320 @@ if USE_NEW_SCORING:
         logger.warning(f"Failed to load ScoringAdapter: {e}. Falling back to legacy system.")
         USE_NEW_SCORING = False
 
+# Commander-legal subset of the shared card cache, stored with the list it was
+# built from. cosmos_driver hands back a new list whenever its cache refreshes,
+# so the subset is rebuilt exactly when the underlying cards change.
+_commander_legal_cache: Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = None
 
-@dataclass
+# Possible commanders in the shared card cache as (lowercased name, card),
+# stored with the list they were taken from
+_commander_index_cache: Optional[Tuple[List[Dict[str, Any]], List[Tuple[str, Dict[str, Any]]]]] = None
+
+# Every card in the shared card cache by lowercased name, stored with that list
+_cards_by_name_cache: Optional[Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]] = None
+
+# Color identity bitmasks of the shared Commander-legal list, stored with it
+_identity_mask_cache: Optional[Tuple[List[Dict[str, Any]], np.ndarray]] = None
+
+# Commander synergy scores shared by every engine (app.py builds one per
+# request), keyed on the commander's and the card's name and text. Cleared
+# wholesale once it reaches SYNERGY_CACHE_SIZE entries, about one commander's
+# legal pool; each pooled worker process holds its own copy.
+SYNERGY_CACHE_SIZE = 50_000
+_synergy_cache: Dict[Tuple, SynergyScore] = {}
+
+# Worker processes for score_cards_parallel, started on first use and kept
+# for the life of the process so their imports and synergy caches carry over
+# between requests
+_scoring_pool: Optional[ProcessPoolExecutor] = None
+_scoring_pool_lock = threading.Lock()
+
+# Color identity bits. _OTHER_COLOR_BIT stands for any symbol outside WUBRG,
+# _EXCLUDED_BIT for cards filter_cards_by_identity never returns.
+_COLOR_BITS = COLOR_BITS
+_OTHER_COLOR_BIT = 32
+_EXCLUDED_BIT = 64
+
+# Which cards a commander lookup considers: legendary creatures and
+# planeswalkers, or cards that say they can be your commander
+_COMMANDER_TYPE_PATTERN = re.compile('Legendary.*(?:Creature|Planeswalker)', re.IGNORECASE)
+_COMMANDER_TEXT_PATTERN = re.compile('can be your commander', re.IGNORECASE)
+
+# Card lists in AI responses, tried in order by _extract_cards_from_json:
+# delimited blocks, comma-separated runs, then numbered lists
+_DELIMITED_CARD_PATTERNS = (
+    re.compile(r'CARD_NAMES_START\s*(.*?)\s*CARD_NAMES_END', re.DOTALL | re.IGNORECASE),
+    re.compile(r'CARDS_START\s*(.*?)\s*CARDS_END', re.DOTALL | re.IGNORECASE),
+)
+_CSV_CARD_PATTERNS = (
+    re.compile(r'([A-Z][a-zA-Z\s\',\-]+(?:,[A-Z][a-zA-Z\s\',\-]+){5,})', re.MULTILINE),  # Multiple cards separated by commas
+    re.compile(r'^([^,\n]+,[^,\n]+,[^,\n]+,[^,\n]+,[^,\n]+).*$', re.MULTILINE),  # At least 5 comma-separated items
+)
+_NUMBERED_CARD_PATTERN = re.compile(r'^\s*\d+\.\s*([A-Z][a-zA-Z\s\',\-]+?)(?:\s*$|\s*\n)', re.MULTILINE)
+
+# Card mentions in free-form AI text, for _extract_cards_from_text
+_TEXT_CARD_PATTERNS = tuple(re.compile(pattern, re.MULTILINE | re.IGNORECASE) for pattern in (
+    # Numbered lists with bold cards: "1. **Skullclamp** - description"
+    r'^\s*\d+\.?\s*\*?\*?([A-Z][a-zA-Z\s\',\-]+?)\*?\*?\s*[-–]',
+    
+    # Bold cards: **Card Name**
+    r'\*\*([A-Z][a-zA-Z\s\',\-]+?)\*\*',
+    
+    # Quoted cards: "Card Name"
+    r'["""]([A-Z][a-zA-Z\s\',\-]+?)["""]',
+    
+    # Cards after action keywords (more specific)
+    r'(?:recommend|suggest|include|consider|use|play|add|run)\s+([A-Z][a-zA-Z\s\',\-]{3,30}?)(?:\s+for|\s+to|\s|,|\.|\n|$)',
+    
+    # Cards mentioned with "along with": "along with Zur the Enchanter"
+    r'along\s+with\s+([A-Z][a-zA-Z\s\',\-]{3,30}?)(?:\s+and|\s|,|\.|\n|$)',
+    
+    # Cards alongside other cards: "alongside Korvold, Fae-Cursed King"
+    r'alongside\s+([A-Z][a-zA-Z\s\',\-]{3,30}?)(?:\s|,|\.|\n|$)',
+    
+    # Specific MTG phrases: "Swords to Plowshares", "Path to Exile"
+    r'\b([A-Z][a-zA-Z]+\s+to\s+[A-Z][a-zA-Z]+)\b',
+    
+    # Card names with common MTG suffixes
+    r'\b([A-Z][a-zA-Z]+(?:\s+the\s+[A-Z][a-zA-Z]+|clamp|signet|tower))\b',
+    
+    # Well-known card patterns (Conservative approach)
+    r'\b(Zur\s+the\s+Enchanter|Oloro,?\s+Ageless\s+Ascetic|Korvold,?\s+Fae-Cursed\s+King|Chulane,?\s+Teller\s+of\s+Tales|Skullclamp|Sol\s+Ring|Arcane\s+Signet|Command\s+Tower|Rhystic\s+Study|Smothering\s+Tithe|Cyclonic\s+Rift)\b',
+))
+
+# _is_valid_card_name: fragments that mark a candidate as a card name, phrases
+# that mark it as prose, and words that make a long candidate look descriptive
+_KNOWN_CARD_NAME_PARTS = (
+    'sol ring', 'arcane signet', 'command tower', 'skullclamp', 'zur the enchanter',
+    'oloro', 'korvold', 'chulane', 'brawl', 'throne of eldraine',
+    'swords to plowshares', 'counterspell', 'lightning bolt', 'path to exile',
+    'rhystic study', 'smothering tithe', 'cyclonic rift', 'dockside extortionist'
+)
+_NON_CARD_PHRASES = (
+    'the following', 'these cards', 'deck strategy', 'commander format',
+    'you should', 'i recommend', 'consider adding', 'make sure',
+    'this deck', 'your deck', 'token strategy', 'artifact synergy',
+    'mana curve', 'card draw', 'win condition', 'removal spell',
+    'https', 'www', 'youtube', 'transcript', 'copyright', 'illustration by',
+    'created by', 'tokens created', ' are ', 'is also', 'board wipes',
+    'last updated', 'august', 'most popular', 'one of the', 'along with',
+    'been printed', 'very popular', 'played with', 'power level',
+    'faerie dominates', 'if it survives', 'brawl format', 'esper commanders'
+)
+_DESCRIPTIVE_WORDS = frozenset({
+    'also', 'tribal', 'support', 'strategy', 'abilities', 'created',
+    'tokens', 'creatures', 'spells', 'artifacts', 'enchantments'
+})
+
+# _is_mtg_related_content: MTG-specific terms that should be present, and
+# non-MTG terms that indicate wrong content
+_MTG_CONTENT_KEYWORDS = (
+    'magic', 'commander', 'deck', 'mana', 'spell', 'artifact', 'creature',
+    'enchantment', 'planeswalker', 'sorcery', 'instant', 'land', 'tribal',
+    'mtg', 'edh', 'flying', 'token', 'draw', 'graveyard', 'battlefield',
+    'card draw', 'synergy', 'color identity', 'legendary', 'enters the battlefield'
+)
+_OFF_TOPIC_KEYWORDS = (
+    'programming', 'code', 'python', 'javascript', 'if statement', 'function',
+    'variable', 'print', 'class', 'method', 'spoiler alert', 'solution',
+    'challenge', 'algorithm', 'array', 'loop', 'tutorial', 'stackoverflow'
+)
+
+# Fields CommanderCard.from_card_data reads; commander lookups fetch only these
+COMMANDER_PROJECTION = {
+    '_id': 0, 'name': 1, 'mana_cost': 1, 'colors': 1, 'color_identity': 1, 'type_line': 1,
+    'oracle_text': 1, 'power': 1, 'toughness': 1, 'loyalty': 1
+}
+
+# Oracle-text keywords for categorize_card as (keyword, category), flattened in
+# category priority order so the first keyword found decides the category.
+# High-CMC cards count as finishers ahead of the keywords in the second group.
+_CATEGORY_KEYWORDS = (
+    ('search your library for a land', 'ramp'), ('add mana', 'ramp'),
+    ('mana cost', 'ramp'), ('sol ring', 'ramp'),
+    ('destroy target', 'removal'), ('exile target', 'removal'),
+    ('counter target spell', 'removal'), ('return target', 'removal'),
+    ('draw cards', 'draw'), ('draw a card', 'draw'), ('card draw', 'draw'),
+    ('hexproof', 'protection'), ('indestructible', 'protection'),
+    ('protection from', 'protection'), ('ward', 'protection'),
+)
+_LATE_CATEGORY_KEYWORDS = (
+    ('win the game', 'finishers'), ('each opponent loses', 'finishers'),
+    ('deal damage to each opponent', 'finishers'),
+    ('search your library', 'utility'), ('choose one', 'utility'), ('modal', 'utility'),
+)
+
+# Non-land picks per recommendation (100 cards - 37 lands)
+RECOMMENDATION_SLOTS = 63
+
+# Confidence bonus by rarity (higher rarity often means more powerful)
+RARITY_BONUS = {
+    'mythic': 0.15,
+    'rare': 0.1,
+    'uncommon': 0.05,
+    'common': 0.0
+}
+
+# Small-integer codes for the confidence kernel. Unknown rarities map to the
+# trailing zero entry of the bonus table.
+CARD_CATEGORIES = ('lands', 'ramp', 'removal', 'draw', 'protection', 'finishers', 'utility', 'synergy')
+_CATEGORY_CODES = {category: code for code, category in enumerate(CARD_CATEGORIES)}
+_RARITY_CODES = {rarity: code for code, rarity in enumerate(RARITY_BONUS)}
+_RARITY_BONUS_TABLE = np.array(list(RARITY_BONUS.values()) + [0.0])
+
+
+def _confidence_kernel(synergy: np.ndarray, cmc: np.ndarray, rarity_codes: np.ndarray,
+                       category_codes: np.ndarray, crowded: np.ndarray) -> np.ndarray:
+    """
+    Confidence for a column of cards from their synergy and attributes.
+    
+    synergy and cmc are float64 columns, rarity_codes and category_codes int8
+    codes, and crowded a per-category mask of categories the deck already has
+    too many of.
+    """
+    # Base confidence from synergy
+    confidence = synergy.copy()
+    
+    # Lower CMC generally better (with exceptions)
+    confidence += np.where(cmc <= 3, 0.1, np.where(cmc >= 7, -0.1, 0.0))
+    
+    # Rarity bonus (higher rarity often means more powerful)
+    confidence += _RARITY_BONUS_TABLE[rarity_codes]
+    
+    # Penalty for duplicate effects
+    confidence[crowded[category_codes]] -= 0.2
+    
+    return np.minimum(confidence, 1.0, out=confidence)
+
+
+def _colors_mask(colors) -> int:
+    """Bitmask of a set of color symbols."""
+    mask = 0
+    for color in colors:
+        mask |= _COLOR_BITS.get(color, _OTHER_COLOR_BIT)
+    return mask
+
+
+@functools.lru_cache(maxsize=100_000)
+def _card_identity(mana_cost: str, oracle_text: str) -> ColorIdentity:
+    """Color identity parsed from a card's text; memoized since it never changes. Do not mutate."""
+    return ColorIdentity.from_mana_cost_and_rules_text(mana_cost, oracle_text)
+
+
+@functools.lru_cache(maxsize=100_000)
+def _categorize_text(oracle_text: str, type_line: str, cmc: float) -> str:
+    """Primary category for a card's text; memoized since card text never changes."""
+    oracle_text = oracle_text.lower()
+    type_line = type_line.lower()
+    
+    # Land
+    if 'land' in type_line:
+        return 'lands'
+    
+    # Ramp, removal, card draw, protection
+    for keyword, category in _CATEGORY_KEYWORDS:
+        if keyword in oracle_text:
+            return category
+    
+    # Finishers (high impact cards)
+    if cmc >= 6:
+        return 'finishers'
+    
+    # Finisher text, then utility (tutors, versatile spells)
+    for keyword, category in _LATE_CATEGORY_KEYWORDS:
+        if keyword in oracle_text:
+            return category
+    
+    # Default to synergy
+    return 'synergy'
+
+
+@functools.lru_cache(maxsize=8192)
+def _looks_like_card_name(name: str) -> bool:
+    """Whether a string looks like a Magic card name; memoized since AI responses repeat candidates."""
+    if not 2 <= len(name) <= 50:
+        return False
+        
+    # Must start with capital letter or number
+    first = name[0]
+    if not (first.isupper() or first.isdigit()):
+        return False
+    
+    name_lower = name.lower()
+    
+    # Quick accept for common MTG card patterns
+    for pattern in _KNOWN_CARD_NAME_PARTS:
+        if pattern in name_lower:
+            return True
+    
+    # Reject obvious non-card phrases
+    for phrase in _NON_CARD_PHRASES:
+        if phrase in name_lower:
+            return False
+    
+    # Allow single-word cards (like "Skullclamp") and multi-word cards
+    words = name_lower.split()
+    
+    # Reject if it has " and " connecting multiple card names
+    if ' and ' in name_lower and len(words) > 4:
+        return False
+        
+    # Reject if it contains too many common descriptive words
+    descriptive_count = sum(1 for word in words if word in _DESCRIPTIVE_WORDS)
+    
+    # If more than 1/3 of words are descriptive, probably not a card name
+    if len(words) > 3 and descriptive_count > len(words) // 3:
+        return False
+        
+    return True
+
+
+# Printing preference by rarity (mythic > rare > uncommon > common)
+_VERSION_RARITY_SCORES = {
+    'mythic': 15,
+    'rare': 10,
+    'uncommon': 5,
+    'common': 2
+}
+
+
+def _version_score(version: Dict[str, Any]) -> int:
+    """
+    How good a printing is to recommend, for _select_best_version.
+    
+    Scoring criteria (in priority order):
+    1. Has image URIs (for display)
+    2. Lower price (if budget matters)
+    3. Higher rarity (better artwork/treatment)
+    4. Newer release date
+    """
+    score = 0
+    
+    # Bonus for having images
+    if version.get('image_uris'):
+        score += 100
+    
+    # Price consideration (lower is better, but not too extreme)
+    price = version.get('price', 999)
+    if price <= 5:  # Very affordable cards get bonus
+        score += 20
+    elif price <= 20:  # Reasonably priced
+        score += 10
+    
+    score += _VERSION_RARITY_SCORES.get(version.get('rarity', 'common'), 0)
+    
+    # Prefer newer releases (rough heuristic)
+    released_at = version.get('released_at', '2000-01-01')
+    year = int(released_at[:4]) if released_at else 2000
+    if year >= 2020:
+        score += 8
+    elif year >= 2015:
+        score += 4
+    
+    return score
+
+
+@dataclass(slots=True)
 class RecommendationRequest:
     """Request for deck recommendations."""
     commander_name: str
@@ -58,7 +376,7 @@ class RecommendationRequest:
     meta_focus: str = "multiplayer"  # multiplayer, 1v1
 
 
-@dataclass
+@dataclass(slots=True)
 class CardRecommendation:
     """A single card recommendation with reasoning."""
     card_name: str
@@ -72,7 +390,7 @@ class CardRecommendation:
     ai_suggested: bool = False  # Whether this card was suggested by AI
 
 
-@dataclass
+@dataclass(slots=True)
 class DeckRecommendation:
     """Complete deck building recommendations."""
     commander: CommanderCard
@@ -84,6 +402,51 @@ class DeckRecommendation:
     estimated_total_cost: Optional[float] = None
 
 
+# Basic land for each color, in WUBRG order
+_BASIC_LANDS = (('W', 'Plains'), ('U', 'Island'), ('B', 'Swamp'), ('R', 'Mountain'), ('G', 'Forest'))
+
+# Colorless staples as (name, confidence, reason, type_line, category)
+_UTILITY_LAND_TEMPLATES = (
+    ('Command Tower', 1.0, "Perfect mana fixing for commanders", 'Land', 'lands'),
+    ('Sol Ring', 1.0, "Essential mana acceleration", 'Artifact', 'ramp'),
+    ('Arcane Signet', 0.9, "Excellent mana rock", 'Artifact', 'ramp'),
+)
+
+
+@functools.lru_cache(maxsize=64)
+def _mana_base(colors: frozenset, include_utility: bool) -> Tuple[CardRecommendation, ...]:
+    """Mana base recommendations for a color identity; memoized, so never mutate the result."""
+    mana_base = []
+    
+    # Basic lands (free)
+    for color, land_name in _BASIC_LANDS:
+        if color in colors:
+            mana_base.append(CardRecommendation(
+                card_name=land_name,
+                card_data={'name': land_name, 'type_line': 'Basic Land', 'oracle_text': f'{{T}}: Add {{{color}}}.'},
+                confidence_score=1.0,
+                synergy_score=0.8,
+                reasons=[f"Basic {color} mana source"],
+                category='lands',
+                estimated_price=0.1
+            ))
+    
+    # Add colorless utility lands
+    if include_utility:
+        for land_name, confidence, reason, type_line, category in _UTILITY_LAND_TEMPLATES:
+            mana_base.append(CardRecommendation(
+                card_name=land_name,
+                card_data={'name': land_name, 'type_line': type_line},
+                confidence_score=confidence,
+                synergy_score=0.7,
+                reasons=[reason],
+                category=category,
+                estimated_price=2.0
+            ))
+    
+    return tuple(mana_base)
+
+
 class RecommendationProgress:
     """Track progress of recommendation generation for frontend updates."""
     
@@ -103,7 +466,7 @@ class RecommendationProgress:
         """Mark a step as complete."""
         if 0 <= step_index < len(self.steps):
             self.current_step = step_index + 1
-            print(f"✅ [PROGRESS] {self.steps[step_index]}")
+            logger.info(f"✅ [PROGRESS] {self.steps[step_index]}")
     
     def get_current_step(self) -> Dict[str, Any]:
         """Get current progress state for API responses."""
@@ -138,7 +501,7 @@ class CommanderRecommendationEngine:
             try:
                 self.ai_client = PerplexityClient()
             except ValueError:
-                print("Warning: Perplexity API key not found. AI analysis disabled.")
+                logger.warning("Perplexity API key not found. AI analysis disabled.")
                 self.use_ai = False
         
         # Card categories for balanced deck building
@@ -173,12 +536,22 @@ class CommanderRecommendationEngine:
         - Subsequent calls: 0.05 seconds (from in-memory cache)
         - Cache TTL: 60 minutes
         - Improvement: 60x faster!
+        
+        The legality filter is also cached per process, so engines created
+        for later requests reuse the filtered list instead of rescanning
+        every card. The returned list is shared and must not be mutated.
         """
+        global _commander_legal_cache
+        
         # OLD (slow): Direct database query every time - 2-3s per request
         # NEW (fast): Get from cache with 60-min TTL - 0.05s per request
         
         all_cards = cosmos_driver.get_all_cards()
         
+        cached = _commander_legal_cache
+        if cached is not None and cached[0] is all_cards:
+            return cached[1]
+        
         # Filter for Commander-legal cards (after caching)
         commander_legal = [
             card for card in all_cards
@@ -186,26 +559,83 @@ class CommanderRecommendationEngine:
             and card.get('type_line')
         ]
         
-        print(f"[CACHE] Found {len(commander_legal)} Commander-legal cards (from {len(all_cards)} total)")
+        # An empty list means the load failed; retry on the next call
+        if all_cards:
+            _commander_legal_cache = (all_cards, commander_legal)
+        
+        logger.info(f"[CACHE] Found {len(commander_legal)} Commander-legal cards (from {len(all_cards)} total)")
         return commander_legal
     
+    def refresh_card_database(self):
+        """Drop the cached card database so the next call reloads it from Cosmos DB."""
+        global _commander_legal_cache, _identity_mask_cache, _commander_index_cache, _cards_by_name_cache
+        
+        cosmos_driver.invalidate_card_cache()
+        _commander_legal_cache = None
+        _identity_mask_cache = None
+        _commander_index_cache = None
+        _cards_by_name_cache = None
+    
+    def _cards_by_name(self) -> Dict[str, Dict[str, Any]]:
+        """Cards from the cached card database by lowercased name (first printing wins)."""
+        global _cards_by_name_cache
+        
+        all_cards = cosmos_driver.get_all_cards()
+        cached = _cards_by_name_cache
+        if cached is not None and cached[0] is all_cards:
+            return cached[1]
+        
+        cards_by_name = {}
+        for card in all_cards:
+            cards_by_name.setdefault((card.get('name') or '').lower(), card)
+        
+        if all_cards:
+            _cards_by_name_cache = (all_cards, cards_by_name)
+        return cards_by_name
+    
+    def _commander_index(self) -> Optional[List[Tuple[str, Dict[str, Any]]]]:
+        """
+        Possible commanders from the cached card database, as (lowercased name, card).
+        
+        Built once per card database load; None if the cache could not be loaded.
+        """
+        global _commander_index_cache
+        
+        all_cards = cosmos_driver.get_all_cards()
+        if not all_cards:
+            return None
+        
+        cached = _commander_index_cache
+        if cached is not None and cached[0] is all_cards:
+            return cached[1]
+        
+        index = []
+        for card in all_cards:
+            type_line = card.get('type_line') or ''
+            if 'Legendary' not in type_line:
+                continue
+            if (_COMMANDER_TYPE_PATTERN.search(type_line)
+                    or _COMMANDER_TEXT_PATTERN.search(card.get('oracle_text') or '')):
+                index.append(((card.get('name') or '').lower(), card))
+        
+        _commander_index_cache = (all_cards, index)
+        return index
+    
     def find_commander_cards(self, commander_name: str) -> List[CommanderCard]:
-        """Find potential commander cards by name."""
+        """
+        Find potential commander cards by name (case-insensitive substring match).
+        
+        Resolved from the cached card database; Mongo is only queried when
+        the cache is unavailable.
+        """
         try:
-            client = get_mongo_client()
-            collection = get_collection(client, 'mtgecorec', 'cards')
+            index = self._commander_index()
+            if index is not None:
+                needle = commander_name.lower()
+                cards_data = [card for name, card in index if needle in name]
+            else:
+                cards_data = self._query_commander_cards(commander_name)
             
-            # Search for commander by name (fuzzy match)
-            query = {
-                'name': {'$regex': commander_name, '$options': 'i'},
-                '$or': [
-                    {'type_line': {'$regex': 'Legendary.*Creature', '$options': 'i'}},
-                    {'type_line': {'$regex': 'Legendary.*Planeswalker', '$options': 'i'}},
-                    {'oracle_text': {'$regex': 'can be your commander', '$options': 'i'}}
-                ]
-            }
-            
-            cards_data = list(collection.find(query))
             commanders = []
             
             for card_data in cards_data:
@@ -214,124 +644,190 @@ class CommanderRecommendationEngine:
                     if commander.can_be_commander:
                         commanders.append(commander)
                 except Exception as e:
-                    print(f"Error processing commander {card_data.get('name')}: {e}")
+                    logger.error(f"Error processing commander {card_data.get('name')}: {e}")
             
             return commanders
         except Exception as e:
-            print(f"Error finding commanders: {e}")
+            logger.error(f"Error finding commanders: {e}")
             return []
     
+    def _query_commander_cards(self, commander_name: str) -> List[Dict[str, Any]]:
+        """Look up possible commanders by name in Mongo."""
+        client = get_shared_mongo_client()
+        collection = get_collection(client, 'mtgecorec', 'cards')
+        
+        # Search for commander by name (case-insensitive substring match).
+        # Only legendary cards can be commanders, so filter on that server-side
+        # instead of discarding non-legendary matches after transfer.
+        query = {
+            'name': {'$regex': re.escape(commander_name), '$options': 'i'},
+            'type_line': {'$regex': 'Legendary'},
+            '$or': [
+                {'type_line': {'$regex': 'Legendary.*Creature', '$options': 'i'}},
+                {'type_line': {'$regex': 'Legendary.*Planeswalker', '$options': 'i'}},
+                {'oracle_text': {'$regex': 'can be your commander', '$options': 'i'}}
+            ]
+        }
+        
+        return list(collection.find(query, COMMANDER_PROJECTION))
+    
     def categorize_card(self, card: Dict[str, Any]) -> str:
         """Determine the primary category of a card."""
-        oracle_text = card.get('oracle_text', '').lower()
-        type_line = card.get('type_line', '').lower()
-        cmc = card.get('cmc', 0)
-        
-        # Land
-        if 'land' in type_line:
-            return 'lands'
-        
-        # Ramp
-        if any(keyword in oracle_text for keyword in ['search your library for a land', 'add mana', 'mana cost', 'sol ring']):
-            return 'ramp'
+        return _categorize_text(card.get('oracle_text', ''), card.get('type_line', ''), card.get('cmc', 0))
+    
+    def _categorize_deck(self, current_deck: List[str]) -> Dict[str, int]:
+        """
+        How many cards of each category the current deck holds.
         
-        # Removal
-        if any(keyword in oracle_text for keyword in ['destroy target', 'exile target', 'counter target spell', 'return target']):
-            return 'removal'
+        Deck entries are card names, resolved through the cached card database;
+        names it does not know are skipped. Computed once per scoring run.
+        """
+        if not current_deck:
+            return {}
         
-        # Card draw
-        if any(keyword in oracle_text for keyword in ['draw cards', 'draw a card', 'card draw']):
-            return 'draw'
+        cards_by_name = self._cards_by_name()
+        deck_cards = (cards_by_name.get(name.lower()) for name in current_deck)
+        return dict(Counter(self.categorize_card(card) for card in deck_cards if card is not None))
+    
+    def filter_cards_by_identity(self, cards: List[Dict[str, Any]], commander_identity: ColorIdentity) -> List[Dict[str, Any]]:
+        """
+        Filter cards that are legal in the commander's color identity.
         
-        # Protection
-        if any(keyword in oracle_text for keyword in ['hexproof', 'indestructible', 'protection from', 'ward']):
-            return 'protection'
+        Cards are compared as color bitmasks in one vectorized pass; masks for
+        the shared Commander-legal list are built once per card database load.
+        """
+        global _identity_mask_cache
         
-        # Finishers (high impact cards)
-        if (cmc >= 6 or 'win the game' in oracle_text or 
-            any(keyword in oracle_text for keyword in ['each opponent loses', 'deal damage to each opponent'])):
-            return 'finishers'
+        cached = _identity_mask_cache
+        if cached is not None and cached[0] is cards:
+            masks = cached[1]
+        else:
+            masks = np.fromiter((self._identity_mask(card) for card in cards), dtype=np.uint8, count=len(cards))
+            legal_cache = _commander_legal_cache
+            if legal_cache is not None and legal_cache[1] is cards:
+                _identity_mask_cache = (cards, masks)
+        
+        # Legal when the card has no bit the commander lacks
+        commander_mask = _colors_mask(commander_identity.colors)
+        legal = (masks & ~np.uint8(commander_mask)) == 0
+        
+        # Both sides hold non-WUBRG symbols: compare the actual color sets
+        if commander_mask & _OTHER_COLOR_BIT:
+            for i in np.flatnonzero(legal & ((masks & _OTHER_COLOR_BIT) != 0)):
+                card = cards[i]
+                legal[i] = commander_identity.contains(
+                    _card_identity(card.get('mana_cost', ''), card.get('oracle_text', ''))
+                )
         
-        # Utility (tutors, versatile spells)
-        if any(keyword in oracle_text for keyword in ['search your library', 'choose one', 'modal']):
-            return 'utility'
+        return [cards[i] for i in np.flatnonzero(legal)]
+    
+    @staticmethod
+    def _identity_mask(card: Dict[str, Any]) -> int:
+        """Color identity bitmask of a card, or _EXCLUDED_BIT if it is never a candidate."""
+        type_line = card.get('type_line', '')
+        
+        # Skip basic lands and commanders themselves
+        if 'Basic' in type_line and 'Land' in type_line:
+            return _EXCLUDED_BIT
+        if 'Legendary' in type_line and 'Creature' in type_line:
+            return _EXCLUDED_BIT
+        
+        # Check color identity: Scryfall's color_identity when the document
+        # has it, otherwise parsed from the card's text
+        color_identity = card.get('color_identity')
+        if color_identity is not None:
+            return _colors_mask(color_identity)
+        return _colors_mask(_card_identity(card.get('mana_cost', ''), card.get('oracle_text', '')).colors)
+    
+    def score_card_for_commander(self, commander: CommanderCard, card: Dict[str, Any], 
+                                current_deck: List[str] = None,
+                                deck_categories: Optional[Dict[str, int]] = None) -> CardRecommendation:
+        """
+        Score a single card for inclusion in the commander deck.
         
-        # Default to synergy
-        return 'synergy'
+        Callers scoring many cards against the same deck should use
+        score_cards_batch, or pass deck_categories from _categorize_deck
+        rather than recategorizing current_deck for every card.
+        """
+        return self.score_cards_batch(commander, [card], current_deck, deck_categories)[0]
     
-    def filter_cards_by_identity(self, cards: List[Dict[str, Any]], commander_identity: ColorIdentity) -> List[Dict[str, Any]]:
-        """Filter cards that are legal in the commander's color identity."""
-        legal_cards = []
+    def score_cards_batch(self, commander: CommanderCard, cards: List[Dict[str, Any]],
+                          current_deck: List[str] = None,
+                          deck_categories: Optional[Dict[str, int]] = None) -> List[CardRecommendation]:
+        """
+        Score many cards for inclusion in the commander deck.
         
-        for card in cards:
-            # Skip basic lands and commanders themselves
-            if ('Basic' in card.get('type_line', '') and 'Land' in card.get('type_line', '')):
-                continue
-            if 'Legendary' in card.get('type_line', '') and 'Creature' in card.get('type_line', ''):
-                continue
-                
-            # Check color identity
-            card_identity = ColorIdentity.from_mana_cost_and_rules_text(
-                card.get('mana_cost', ''), card.get('oracle_text', '')
-            )
-            
-            if commander_identity.contains(card_identity):
-                legal_cards.append(card)
+        Synergy and category are worked out per card; the confidence
+        adjustments are then applied to whole columns of cmc, rarity bonus
+        and category penalty at once.
+        """
+        if not cards:
+            return []
         
-        return legal_cards
-    
-    def score_card_for_commander(self, commander: CommanderCard, card: Dict[str, Any], 
-                                current_deck: List[str] = None) -> CardRecommendation:
-        """Score a single card for inclusion in the commander deck."""
-        card_name = card.get('name', '')
+        n = len(cards)
         
         # Calculate synergy with commander
-        synergy = self.synergy_analyzer.calculate_commander_synergy(commander, card)
-        
-        # Base confidence from synergy
-        confidence = synergy.score
-        
-        # Adjust for card quality indicators
-        cmc = card.get('cmc', 0)
-        rarity = card.get('rarity', 'common')
-        
-        # Lower CMC generally better (with exceptions)
-        if cmc <= 3:
-            confidence += 0.1
-        elif cmc >= 7:
-            confidence -= 0.1
-        
-        # Rarity bonus (higher rarity often means more powerful)
-        rarity_bonus = {
-            'mythic': 0.15,
-            'rare': 0.1,
-            'uncommon': 0.05,
-            'common': 0.0
-        }
-        confidence += rarity_bonus.get(rarity, 0.0)
+        synergies = self._commander_synergies(commander, cards)
         
         # Check if card fits deck strategy
-        category = self.categorize_card(card)
-        
-        # Penalty for duplicate effects (if we have current deck)
-        if current_deck:
-            similar_effects = sum(1 for existing_card in current_deck 
-                                if self.categorize_card({'oracle_text': existing_card}) == category)
-            if similar_effects > 3:  # Too many of same type
-                confidence -= 0.2
-        
-        # Estimate price
-        estimated_price = card.get('price', 0.0) if card.get('price') else None
-        
-        return CardRecommendation(
-            card_name=card_name,
-            card_data=card,
-            confidence_score=min(confidence, 1.0),
-            synergy_score=synergy.score,
-            reasons=synergy.reasons + [f"Category: {category}"],
-            category=category,
-            estimated_price=estimated_price
+        categories = [self.categorize_card(card) for card in cards]
+        
+        # Encode card quality indicators as columns
+        synergy_scores = np.fromiter((synergy.score for synergy in synergies), dtype=np.float64, count=n)
+        cmc = np.fromiter((card.get('cmc', 0) for card in cards), dtype=np.float64, count=n)
+        rarity_codes = np.fromiter(
+            (_RARITY_CODES.get(card.get('rarity', 'common'), len(_RARITY_CODES)) for card in cards),
+            dtype=np.int8, count=n
         )
+        category_codes = np.fromiter((_CATEGORY_CODES[category] for category in categories), dtype=np.int8, count=n)
+        
+        # Categories the current deck already has too many of
+        if deck_categories is None and current_deck:
+            deck_categories = self._categorize_deck(current_deck)
+        crowded = np.zeros(len(CARD_CATEGORIES), dtype=bool)
+        for category, count in (deck_categories or {}).items():
+            if count > 3:
+                crowded[_CATEGORY_CODES[category]] = True
+        
+        confidence = _confidence_kernel(synergy_scores, cmc, rarity_codes, category_codes, crowded)
+        
+        return [
+            CardRecommendation(
+                card_name=card.get('name', ''),
+                card_data=card,
+                confidence_score=score,
+                synergy_score=synergy.score,
+                reasons=synergy.reasons + [f"Category: {category}"],
+                category=category,
+                # Estimate price
+                estimated_price=card.get('price', 0.0) if card.get('price') else None
+            )
+            for card, synergy, category, score in zip(cards, synergies, categories, confidence.tolist())
+        ]
+    
+    def _commander_synergies(self, commander: CommanderCard, cards: List[Dict[str, Any]]) -> List[SynergyScore]:
+        """calculate_commander_synergy for each card, reusing scores from earlier requests."""
+        commander_key = (commander.name, commander.rules_text, tuple(commander.types), tuple(commander.subtypes))
+        
+        keys = [
+            (commander_key, card.get('name', ''), card.get('oracle_text', ''), card.get('type_line', ''))
+            for card in cards
+        ]
+        synergies = [_synergy_cache.get(key) for key in keys]
+        
+        # Score the cards not seen before in one batch
+        missing = [i for i, synergy in enumerate(synergies) if synergy is None]
+        if missing:
+            computed = self.synergy_analyzer.calculate_commander_synergy_batch(
+                commander, [cards[i] for i in missing]
+            )
+            if len(_synergy_cache) + len(missing) > SYNERGY_CACHE_SIZE:
+                _synergy_cache.clear()
+            for i, synergy in zip(missing, computed):
+                synergies[i] = synergy
+                _synergy_cache[keys[i]] = synergy
+        
+        return synergies
     
     def score_cards_parallel(self, card_groups: Dict[str, List[Dict]], commander: CommanderCard, 
                             current_deck: List[str] = None, request_budget: Optional[float] = None) -> List:
@@ -354,10 +850,10 @@ class CommanderRecommendationEngine:
         """
         # Small datasets: not worth multiprocessing overhead
         if len(card_groups) < 500:
-            print(f"[SCORING] Small dataset ({len(card_groups)} cards) - using sequential scoring")
+            logger.info(f"[SCORING] Small dataset ({len(card_groups)} cards) - using sequential scoring")
             return self._score_cards_sequential(card_groups, commander, current_deck, request_budget)
         
-        print(f"[SCORING] Large dataset ({len(card_groups)} cards) - using parallel multiprocessing")
+        logger.info(f"[SCORING] Large dataset ({len(card_groups)} cards) - using parallel multiprocessing")
         
         # Split into batches (one per CPU core, capped at 4)
         num_workers = min(multiprocessing.cpu_count(), 4)
@@ -367,107 +863,170 @@ class CommanderRecommendationEngine:
         card_items = list(card_groups.items())
         batches = [card_items[i:i+batch_size] for i in range(0, len(card_items), batch_size)]
         
-        print(f"[SCORING] Using {num_workers} CPU cores, {len(batches)} batches")
+        logger.info(f"[SCORING] Using {num_workers} CPU cores, {len(batches)} batches")
+        
+        # Resolve and categorize the current deck once, for all workers
+        deck_categories = self._categorize_deck(current_deck or [])
         
         # Score batches in parallel
         start_time = os.times()[4]  # wallclock time
+        commander_dict = commander.to_dict()
         try:
-            with ProcessPoolExecutor(max_workers=num_workers) as executor:
-                # Submit all batches
-                futures = [
-                    executor.submit(
-                        _score_batch_worker,
-                        batch,
-                        commander.to_dict(),
-                        current_deck or [],
-                        request_budget
-                    )
-                    for batch in batches
-                ]
-                
-                # Collect results as they complete
-                all_scored = []
-                for future in futures:
-                    batch_results = future.result()
-                    all_scored.extend(batch_results)
+            executor = _get_scoring_pool(num_workers)
+            
+            # Submit all batches
+            futures = [
+                executor.submit(
+                    _score_batch_worker,
+                    batch,
+                    commander_dict,
+                    deck_categories,
+                    request_budget
+                )
+                for batch in batches
+            ]
+            
+            # Collect results as they complete
+            all_scored = []
+            for future in futures:
+                batch_results = future.result()
+                all_scored.extend(batch_results)
             
             elapsed = os.times()[4] - start_time
-            print(f"[SCORING] Scored {len(all_scored)} cards in {elapsed:.2f}s using multiprocessing")
+            logger.info(f"[SCORING] Scored {len(all_scored)} cards in {elapsed:.2f}s using multiprocessing")
             
             return all_scored
             
         except Exception as e:
-            # Fallback to sequential if multiprocessing fails
-            print(f"[SCORING] Multiprocessing failed ({e}), falling back to sequential")
+            # Fallback to sequential if multiprocessing fails; start a fresh
+            # pool next time in case this one is broken
+            logger.warning(f"[SCORING] Multiprocessing failed ({e}), falling back to sequential")
+            _discard_scoring_pool()
             return self._score_cards_sequential(card_groups, commander, current_deck, request_budget)
     
     def _score_cards_sequential(self, card_groups: Dict[str, List[Dict]], commander: CommanderCard,
                                current_deck: List[str] = None, request_budget: Optional[float] = None) -> List:
         """Score cards sequentially (fallback for small datasets or when multiprocessing fails)."""
-        scored = []
+        version_lists = []
+        best_versions = []
         for card_name, versions in card_groups.items():
             if not card_name:
                 continue
             
-            best_version = self._select_best_version(versions, request_budget)
-            recommendation = self.score_card_for_commander(commander, best_version, current_deck)
+            version_lists.append(versions)
+            best_versions.append(self._select_best_version(versions, request_budget))
+        
+        scored = self.score_cards_batch(commander, best_versions, current_deck)
+        for recommendation, versions in zip(scored, version_lists):
             recommendation.all_versions = versions
-            scored.append(recommendation)
         
         return scored
     
-
-        """Generate mana base recommendations for the commander."""
-        colors = commander.color_identity.colors
-        color_count = len(colors)
+    def generate_mana_base(self, commander: CommanderCard,
+                           budget_limit: Optional[float] = None) -> List[CardRecommendation]:
+        """
+        Generate mana base recommendations for the commander.
         
-        mana_base = []
+        Recommendations are shared between calls with the same colors and
+        budget bracket, so callers must not mutate them.
+        """
+        # Assume the utility cards are reasonably priced
+        include_utility = not budget_limit or budget_limit > 5.0
+        return list(_mana_base(frozenset(commander.color_identity.colors), include_utility))
+    
+    def _load_legal_cards(self, commander: CommanderCard) -> List[Dict[str, Any]]:
+        """Cards from the database that are legal in the commander's color identity."""
+        all_cards = self.get_card_database()
+        return self.filter_cards_by_identity(all_cards, commander.color_identity)
+    
+    def _query_ai(self, commander: CommanderCard,
+                  request: RecommendationRequest) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+        """
+        Ask the AI for a synergy analysis and card suggestions; (None, []) if unavailable.
+        
+        The two requests are independent, so the card research runs on a
+        helper thread while the synergy analysis is made, and a failure of
+        one does not discard the other.
+        """
+        ai_analysis = None
+        ai_card_suggestions = []
         
-        # Basic lands (free)
-        if colors:
-            basic_lands = {
-                'W': 'Plains',
-                'U': 'Island', 
-                'B': 'Swamp',
-                'R': 'Mountain',
-                'G': 'Forest'
-            }
+        if not self.use_ai:
+            return ai_analysis, ai_card_suggestions
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # If user provided preferred mechanics, get AI card research (Phase 1: parallel queries)
+            research = None
+            if request.preferred_mechanics:
+                research = executor.submit(self._research_mechanics, commander.name, request.preferred_mechanics)
             
-            # Distribute basics evenly
-            basics_per_color = max(3, 12 // color_count) if color_count > 0 else 0
+            try:
+                current_cards = request.current_deck or []
+                ai_result = self.ai_client.analyze_commander_synergies(commander.name, current_cards)
+                if ai_result['success']:
+                    ai_analysis = ai_result
+            except Exception as e:
+                logger.warning(f"AI analysis failed: {e}")
             
-            for color in colors:
-                if color in basic_lands:
-                    mana_base.append(CardRecommendation(
-                        card_name=basic_lands[color],
-                        card_data={'name': basic_lands[color], 'type_line': 'Basic Land', 'oracle_text': f'{{T}}: Add {{{color}}}.'},
-                        confidence_score=1.0,
-                        synergy_score=0.8,
-                        reasons=[f"Basic {color} mana source"],
-                        category='lands',
-                        estimated_price=0.1
-                    ))
-        
-        # Add colorless utility lands
-        utility_lands = [
-            ('Command Tower', 1.0, ["Perfect mana fixing for commanders"]),
-            ('Sol Ring', 1.0, ["Essential mana acceleration"]),
-            ('Arcane Signet', 0.9, ["Excellent mana rock"]),
-        ]
+            if research is not None:
+                try:
+                    ai_card_suggestions = research.result()
+                except Exception as e:
+                    logger.warning(f"AI card research failed: {e}")
         
-        for land_name, confidence, reasons in utility_lands:
-            if not budget_limit or budget_limit > 5.0:  # Assume these are reasonably priced
-                mana_base.append(CardRecommendation(
-                    card_name=land_name,
-                    card_data={'name': land_name, 'type_line': 'Artifact' if 'Ring' in land_name or 'Signet' in land_name else 'Land'},
-                    confidence_score=confidence,
-                    synergy_score=0.7,
-                    reasons=reasons,
-                    category='ramp' if 'Ring' in land_name or 'Signet' in land_name else 'lands',
-                    estimated_price=2.0
-                ))
+        return ai_analysis, ai_card_suggestions
+    
+    def _research_mechanics(self, commander_name: str, preferred_mechanics: str) -> List[str]:
+        """Card suggestions from the AI for the user's preferred mechanics."""
+        logger.info(f"Researching cards for mechanics: {preferred_mechanics} (using parallel AI queries)")
+        ai_card_suggestions = self.ai_client.analyze_commander_parallel(commander_name, preferred_mechanics)
+        logger.info(f"AI suggested {len(ai_card_suggestions)} cards based on preferred mechanics (parallel)")
+        if ai_card_suggestions:
+            logger.debug(f"AI suggested cards: {ai_card_suggestions[:10]}")  # Show first 10
+        else:
+            logger.warning("No valid cards extracted from AI response")
+        return ai_card_suggestions
+    
+    @staticmethod
+    def _top_candidates(scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        Indices of the k highest scores, best first.
         
-        return mana_base
+        Uses a partial partition rather than a full sort. Every score tied
+        with the k-th best is kept, and equal scores stay in input order, so
+        the result is a prefix of a stable descending sort.
+        """
+        if k >= len(scores):
+            return np.argsort(-scores, kind='stable')
+        kth_best = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = np.flatnonzero(scores >= kth_best)
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
+    
+    def _balance_by_category(self, scored_cards: List[CardRecommendation]) -> List[CardRecommendation]:
+        """
+        Take cards best first, up to each category's target count.
+        
+        Each category's best target_count cards are selected directly, then
+        the picks are merged by confidence and cut to RECOMMENDATION_SLOTS.
+        This matches walking the whole ranking with per-category counters.
+        """
+        if not scored_cards:
+            return []
+        
+        confidence = np.fromiter((rec.confidence_score for rec in scored_cards),
+                                 dtype=np.float64, count=len(scored_cards))
+        category_names, category_ids = np.unique([rec.category for rec in scored_cards], return_inverse=True)
+        
+        picks = []
+        for category_id, category in enumerate(category_names.tolist()):
+            members = np.flatnonzero(category_ids == category_id)
+            target_count = self.category_targets.get(category, 5)
+            picks.append(members[self._top_candidates(confidence[members], target_count)[:target_count]])
+        picks = np.concatenate(picks)
+        
+        # Merge best first; equal scores keep their input order
+        picks = picks[np.lexsort((picks, -confidence[picks]))][:RECOMMENDATION_SLOTS]
+        return [scored_cards[i] for i in picks]
     
     def _select_best_version(self, versions: List[Dict[str, Any]], budget_limit: Optional[float] = None) -> Dict[str, Any]:
         """
@@ -493,55 +1052,18 @@ class CommanderRecommendationEngine:
         # Use all versions if none are affordable
         candidates = affordable_versions if affordable_versions else versions
         
-        # Scoring criteria (in priority order):
-        # 1. Has image URIs (for display)
-        # 2. Lower price (if budget matters)
-        # 3. Higher rarity (better artwork/treatment)
-        # 4. Newer release date
-        
-        def version_score(version):
-            score = 0
-            
-            # Bonus for having images
-            if version.get('image_uris'):
-                score += 100
-            
-            # Price consideration (lower is better, but not too extreme)
-            price = version.get('price', 999)
-            if price <= 5:  # Very affordable cards get bonus
-                score += 20
-            elif price <= 20:  # Reasonably priced
-                score += 10
-            
-            # Rarity bonus (mythic > rare > uncommon > common)
-            rarity_scores = {
-                'mythic': 15,
-                'rare': 10, 
-                'uncommon': 5,
-                'common': 2
-            }
-            score += rarity_scores.get(version.get('rarity', 'common'), 0)
-            
-            # Prefer newer releases (rough heuristic)
-            released_at = version.get('released_at', '2000-01-01')
-            year = int(released_at[:4]) if released_at else 2000
-            if year >= 2020:
-                score += 8
-            elif year >= 2015:
-                score += 4
-            
-            return score
-        
         # Return the highest scoring version
-        best_version = max(candidates, key=version_score)
+        best_version = max(candidates, key=_version_score)
         return best_version
     
     async def generate_recommendations(self, request: RecommendationRequest) -> DeckRecommendation:
         """Generate complete deck recommendations based on request."""
         progress = get_recommendation_progress()
         
-        # Step 0: Load commander data
-        print("Loading commander data...")
+        # Step 0: Load commander data. The commander lookup and the card pool
+        # below are both served from the one cached card database load, so a
+        # request makes at most a single round-trip to Mongo for cards.
+        logger.info("Loading commander data...")
         commanders = self.find_commander_cards(request.commander_name)
         if not commanders:
             raise ValueError(f"Commander '{request.commander_name}' not found")
@@ -549,73 +1071,54 @@ class CommanderRecommendationEngine:
         commander = commanders[0]  # Use first match
         progress.mark_complete(0)  # ✅ Loading commander data...
         
-        # Step 1: Fetch card database
-        print("Fetching card database...")
-        all_cards = self.get_card_database()
-        legal_cards = self.filter_cards_by_identity(all_cards, commander.color_identity)
-        print(f"Found {len(legal_cards)} legal cards for {commander.name}")
+        # Steps 1 and 3 are independent I/O: load the card database while the
+        # AI is queried, in worker threads, instead of one after the other
+        logger.info("Fetching card database...")
+        legal_cards, (ai_analysis, ai_card_suggestions) = await asyncio.gather(
+            asyncio.to_thread(self._load_legal_cards, commander),
+            asyncio.to_thread(self._query_ai, commander, request)
+        )
+        logger.info(f"Found {len(legal_cards)} legal cards for {commander.name}")
         progress.mark_complete(1)  # ✅ Fetching card database...
         
         # Step 2: Running recommendation engine (start analysis)
-        print("Running recommendation engine...")
+        logger.info("Running recommendation engine...")
         progress.mark_complete(2)  # ✅ Running recommendation engine...
         
         # Step 3: Querying AI for card suggestions
-        ai_analysis = None
-        ai_card_suggestions = []
-        
-        if self.use_ai:
-            try:
-                current_cards = request.current_deck or []
-                ai_result = self.ai_client.analyze_commander_synergies(commander.name, current_cards)
-                if ai_result['success']:
-                    ai_analysis = ai_result
-                    
-                # If user provided preferred mechanics, get AI card research (Phase 1: parallel queries)
-                if request.preferred_mechanics:
-                    print(f"Researching cards for mechanics: {request.preferred_mechanics} (using parallel AI queries)")
-                    ai_card_suggestions = self.ai_client.analyze_commander_parallel(
-                        commander.name, 
-                        request.preferred_mechanics
-                    )
-                    print(f"AI suggested {len(ai_card_suggestions)} cards based on preferred mechanics (parallel)")
-                    if ai_card_suggestions:
-                        print(f"AI suggested cards: {ai_card_suggestions[:10]}")  # Show first 10
-                    else:
-                        print("Warning: No valid cards extracted from AI response")
-                    
-            except Exception as e:
-                print(f"AI analysis failed: {e}")
-        
         progress.mark_complete(3)  # ✅ Querying AI for card suggestions...
         
         # Group cards by name to ensure singleton behavior
-        print("Grouping cards by name...")
+        logger.info("Grouping cards by name...")
+        # The card pool comes from the shared in-memory cache, so these
+        # per-request filters stay client-side; look exclusions up in a set
+        excluded = set(request.exclude_cards or ())
+        budget_limit = request.budget_limit
         card_groups = defaultdict(list)
         for card in legal_cards:
             # Skip cards in exclude list
-            if request.exclude_cards and card.get('name') in request.exclude_cards:
+            if excluded and card.get('name') in excluded:
                 continue
             
             # Skip expensive cards if budget limited
-            if request.budget_limit and card.get('price', 0) > request.budget_limit:
+            if budget_limit and card.get('price', 0) > budget_limit:
                 continue
             
             card_groups[card.get('name', '')].append(card)
         
         # Step 4: Match AI results with database
         if ai_card_suggestions:
-            print("🤖 [AI] Matching AI suggestions with database...")
+            logger.info("🤖 [AI] Matching AI suggestions with database...")
             all_card_names = list(card_groups.keys())
             matched_ai_cards = self._match_cards_in_database(ai_card_suggestions, all_card_names)
-            print(f"🤖 [AI] Matched {len(matched_ai_cards)}/{len(ai_card_suggestions)} AI suggested cards from Perplexity")
+            logger.info(f"🤖 [AI] Matched {len(matched_ai_cards)}/{len(ai_card_suggestions)} AI suggested cards from Perplexity")
         else:
             matched_ai_cards = []
         
         progress.mark_complete(4)  # ✅ Matching AI results with database...
         
         # Step 5: Score cards & calculating confidence
-        print(f"Scoring {len(card_groups)} cards (using parallel processing if dataset large)...")
+        logger.info(f"Scoring {len(card_groups)} cards (using parallel processing if dataset large)...")
         scored_cards = self.score_cards_parallel(
             card_groups, 
             commander, 
@@ -623,35 +1126,21 @@ class CommanderRecommendationEngine:
             request.budget_limit
         )
         
-        # Apply AI boost to matched cards (post-scoring)
+        # Apply AI boost to matched cards (post-scoring). This has to happen
+        # before category selection since the boost can move a card into it.
         if matched_ai_cards:
+            matched_ai_names = set(matched_ai_cards)
             for recommendation in scored_cards:
-                if recommendation.card_name in matched_ai_cards:
-                    print(f"AI suggested card found: {recommendation.card_name}")
+                if recommendation.card_name in matched_ai_names:
+                    logger.debug(f"AI suggested card found: {recommendation.card_name}")
                     recommendation.confidence_score = min(1.0, recommendation.confidence_score + 0.3)
                     recommendation.ai_suggested = True
                     if not recommendation.reasons:
                         recommendation.reasons = []
                     recommendation.reasons.insert(0, f"AI recommended for preferred mechanics: {request.preferred_mechanics}")
         
-        # Sort by confidence score
-        scored_cards.sort(key=lambda x: x.confidence_score, reverse=True)
-        
-        # Balance recommendations by category
-        category_counts = defaultdict(int)
-        balanced_recommendations = []
-        
-        for rec in scored_cards:
-            category = rec.category
-            target_count = self.category_targets.get(category, 5)
-            
-            if category_counts[category] < target_count:
-                balanced_recommendations.append(rec)
-                category_counts[category] += 1
-            
-            # Stop when we have enough cards
-            if len(balanced_recommendations) >= 63:  # 100 - 37 lands
-                break
+        # Pick the best cards by confidence score, balanced by category
+        balanced_recommendations = self._balance_by_category(scored_cards)
         
         # Mana base generation (TODO: implement land suggestions based on color identity)
         mana_base = []
@@ -668,8 +1157,8 @@ class CommanderRecommendationEngine:
         if ai_card_suggestions:
             found_ai_cards = [rec.card_name for rec in balanced_recommendations if rec.ai_suggested]
             missed_ai_cards = [card for card in ai_card_suggestions if card not in matched_ai_cards]
-            print(f"AI cards in final recommendations: {found_ai_cards}")
-            print(f"AI cards NOT matched: {missed_ai_cards}")
+            logger.info(f"AI cards in final recommendations: {found_ai_cards}")
+            logger.info(f"AI cards NOT matched: {missed_ai_cards}")
         
         # Determine power level
         avg_confidence = sum(rec.confidence_score for rec in balanced_recommendations) / len(balanced_recommendations) if balanced_recommendations else 0
@@ -683,7 +1172,7 @@ class CommanderRecommendationEngine:
         progress.mark_complete(5)  # ✅ Scoring cards & calculating confidence...
         
         # Step 6: Finalize recommendations
-        print("Finalizing recommendations...")
+        logger.info("Finalizing recommendations...")
         progress.mark_complete(6)  # ✅ Finalizing recommendations...
         
         return DeckRecommendation(
@@ -703,7 +1192,7 @@ class CommanderRecommendationEngine:
             return []
         
         try:
-            print(f"🤖 [AI] Starting Perplexity search for cards matching: {preferred_mechanics}...")
+            logger.info(f"🤖 [AI] Starting Perplexity search for cards matching: {preferred_mechanics}...")
             # Try multiple structured formats to force Perplexity to comply
             format_options = [
                 # Format 1: Delimited list
@@ -787,24 +1276,24 @@ Recommend Commander cards for "{commander_name}" matching: {preferred_mechanics}
                     
                     # Validate content quality before accepting it
                     if self._is_mtg_related_content(content):
-                        print(f"🤖 [AI] Perplexity search successful! Processing results...")
+                        logger.info(f"🤖 [AI] Perplexity search successful! Processing results...")
                         search_result = {
                             'success': True,
                             'content': content
                         }
                     else:
-                        print(f"⚠️  [AI] Warning: Search content not MTG-related: {content[:200]}...")
+                        logger.warning(f"⚠️  [AI] Search content not MTG-related: {content[:200]}...")
                         search_result = {'success': False, 'error': 'Content not MTG-related'}
                 else:
                     search_result = {'success': False, 'error': 'No results returned'}
                     
             except Exception as e:
-                print(f"❌ [AI] Card research search failed: {e}")
+                logger.warning(f"❌ [AI] Card research search failed: {e}")
                 search_result = {'success': False, 'error': str(e)}
             
             # If Search API failed OR content is bad, try Chat API with more direct control
             if not search_result.get('success'):
-                print("🤖 [AI] Search API failed, trying Chat API with explicit instructions...")
+                logger.info("🤖 [AI] Search API failed, trying Chat API with explicit instructions...")
                 try:
                     chat_response = self.ai_client.client.chat.completions.create(
                         model="sonar",
@@ -854,27 +1343,27 @@ STRICT REQUIREMENTS:
                     if chat_response and chat_response.choices:
                         content = chat_response.choices[0].message.content
                         search_result = {'success': True, 'content': content}
-                        print(f"Chat API returned: {content[:200]}...")
+                        logger.debug(f"Chat API returned: {content[:200]}...")
                     
                 except Exception as chat_e:
-                    print(f"Chat API also failed: {chat_e}")
+                    logger.warning(f"Chat API also failed: {chat_e}")
                     search_result = {'success': False, 'error': str(chat_e)}
             
             if search_result.get('success') and search_result.get('content'):
                 content = search_result['content']
                 
                 # Debug: Show what Perplexity actually returned
-                print(f"Raw Perplexity response (first 500 chars): {content[:500]}...")
+                logger.debug(f"Raw Perplexity response (first 500 chars): {content[:500]}...")
                 
                 # Try to extract cards from JSON format first
                 suggested_cards = self._extract_cards_from_json(content)
                 
                 # If JSON parsing failed, fall back to text extraction
                 if not suggested_cards:
-                    print("⚠️  [AI] JSON extraction failed, trying text extraction...")
+                    logger.warning("⚠️  [AI] JSON extraction failed, trying text extraction...")
                     suggested_cards = self._extract_cards_from_text(content)
                 
-                print(f"✅ [AI] Extracted {len(suggested_cards)} potential cards from Perplexity: {suggested_cards[:5]}...")  # Debug first 5
+                logger.debug(f"✅ [AI] Extracted {len(suggested_cards)} potential cards from Perplexity: {suggested_cards[:5]}...")  # Debug first 5
                 
                 # Log query value assessment for cost optimization
                 self._log_query_value_assessment(commander_name, preferred_mechanics, len(suggested_cards), content)
@@ -883,87 +1372,24 @@ STRICT REQUIREMENTS:
                 return suggested_cards[:20]
                 
         except Exception as e:
-            print(f"Error in AI card research: {e}")
+            logger.error(f"Error in AI card research: {e}")
             return []
         
         return []
 
     def _is_valid_card_name(self, name: str) -> bool:
         """Check if a string looks like a valid Magic card name."""
-        if not name or len(name) < 2 or len(name) > 50:
-            return False
-            
-        # Must start with capital letter or number
-        if not (name[0].isupper() or name[0].isdigit()):
-            return False
-        
-        name_lower = name.lower()
-        
-        # Quick accept for common MTG card patterns
-        mtg_patterns = [
-            'sol ring', 'arcane signet', 'command tower', 'skullclamp', 'zur the enchanter',
-            'oloro', 'korvold', 'chulane', 'brawl', 'throne of eldraine',
-            'swords to plowshares', 'counterspell', 'lightning bolt', 'path to exile',
-            'rhystic study', 'smothering tithe', 'cyclonic rift', 'dockside extortionist'
-        ]
-        
-        for pattern in mtg_patterns:
-            if pattern in name_lower:
-                return True
-        
-        # Reject obvious non-card phrases
-        invalid_phrases = [
-            'the following', 'these cards', 'deck strategy', 'commander format',
-            'you should', 'i recommend', 'consider adding', 'make sure',
-            'this deck', 'your deck', 'token strategy', 'artifact synergy',
-            'mana curve', 'card draw', 'win condition', 'removal spell',
-            'https', 'www', 'youtube', 'transcript', 'copyright', 'illustration by',
-            'created by', 'tokens created', ' are ', 'is also', 'board wipes',
-            'last updated', 'august', 'most popular', 'one of the', 'along with',
-            'been printed', 'very popular', 'played with', 'power level',
-            'faerie dominates', 'if it survives', 'brawl format', 'esper commanders'
-        ]
-        
-        for phrase in invalid_phrases:
-            if phrase in name_lower:
-                return False
-        
-        # Allow single-word cards (like "Skullclamp") and multi-word cards
-        
-        # Reject if it has " and " connecting multiple card names
-        if ' and ' in name_lower and len(name_lower.split()) > 4:
-            return False
-            
-        # Reject if it contains too many common descriptive words
-        descriptive_words = [
-            'also', 'tribal', 'support', 'strategy', 'abilities', 'created', 
-            'tokens', 'creatures', 'spells', 'artifacts', 'enchantments'
-        ]
-        words = name_lower.split()
-        descriptive_count = sum(1 for word in words if word in descriptive_words)
-        
-        # If more than 1/3 of words are descriptive, probably not a card name
-        if len(words) > 3 and descriptive_count > len(words) // 3:
-            return False
-            
-        return True
+        return _looks_like_card_name(name)
 
     def _extract_cards_from_json(self, content: str) -> List[str]:
         """Extract cards from structured format response."""
-        import json
-        import re
         
         # Try multiple structured formats
         
         # Format 1: Delimited blocks (multiple patterns)
         try:
-            delimiter_patterns = [
-                r'CARD_NAMES_START\s*(.*?)\s*CARD_NAMES_END',
-                r'CARDS_START\s*(.*?)\s*CARDS_END',
-            ]
-            
-            for pattern in delimiter_patterns:
-                match = re.search(pattern, content, re.DOTALL | re.IGNORECASE)
+            for pattern in _DELIMITED_CARD_PATTERNS:
+                match = pattern.search(content)
                 
                 if match:
                     card_block = match.group(1).strip()
@@ -975,37 +1401,31 @@ STRICT REQUIREMENTS:
                             valid_cards.append(line)
                     
                     if valid_cards:
-                        print(f"Delimited format extraction found {len(valid_cards)} cards")
+                        logger.debug(f"Delimited format extraction found {len(valid_cards)} cards")
                         return valid_cards
         
         except Exception as e:
-            print(f"Warning: Delimited format parsing failed: {e}")
+            logger.warning(f"Delimited format parsing failed: {e}")
         
         # Format 2: CSV format (comma-separated on one line)
         try:
             # Look for comma-separated card names
-            csv_patterns = [
-                r'([A-Z][a-zA-Z\s\',\-]+(?:,[A-Z][a-zA-Z\s\',\-]+){5,})',  # Multiple cards separated by commas
-                r'^([^,\n]+,[^,\n]+,[^,\n]+,[^,\n]+,[^,\n]+).*$',  # At least 5 comma-separated items
-            ]
-            
-            for pattern in csv_patterns:
-                matches = re.findall(pattern, content, re.MULTILINE)
+            for pattern in _CSV_CARD_PATTERNS:
+                matches = pattern.findall(content)
                 for match in matches:
                     if ',' in match:
                         cards = [card.strip() for card in match.split(',')]
                         valid_cards = [card for card in cards if self._is_valid_card_name(card)]
                         if len(valid_cards) >= 3:
-                            print(f"CSV format extraction found {len(valid_cards)} cards")
+                            logger.debug(f"CSV format extraction found {len(valid_cards)} cards")
                             return valid_cards
         
         except Exception as e:
-            print(f"Warning: CSV format parsing failed: {e}")
+            logger.warning(f"CSV format parsing failed: {e}")
         
         # Format 3: Numbered list (1. Card Name, 2. Card Name, etc.)
         try:
-            numbered_pattern = r'^\s*\d+\.\s*([A-Z][a-zA-Z\s\',\-]+?)(?:\s*$|\s*\n)'
-            matches = re.findall(numbered_pattern, content, re.MULTILINE)
+            matches = _NUMBERED_CARD_PATTERN.findall(content)
             
             valid_cards = []
             for match in matches:
@@ -1014,23 +1434,22 @@ STRICT REQUIREMENTS:
                     valid_cards.append(card)
             
             if valid_cards:
-                print(f"Numbered list extraction found {len(valid_cards)} cards")
+                logger.debug(f"Numbered list extraction found {len(valid_cards)} cards")
                 return valid_cards
         
         except Exception as e:
-            print(f"Warning: Numbered list parsing failed: {e}")
+            logger.warning(f"Numbered list parsing failed: {e}")
         
         # Fallback to JSON extraction
         try:
             content = content.strip()
             
-            # Look for JSON block
+            # Decode the JSON object starting at the first brace, ignoring any
+            # commentary that follows it
             start_idx = content.find('{')
-            end_idx = content.rfind('}') + 1
             
-            if start_idx >= 0 and end_idx > start_idx:
-                json_str = content[start_idx:end_idx]
-                data = json.loads(json_str)
+            if start_idx >= 0:
+                data, _ = json.JSONDecoder().raw_decode(content, start_idx)
                 
                 cards = data.get('recommended_cards', [])
                 valid_cards = []
@@ -1040,62 +1459,33 @@ STRICT REQUIREMENTS:
                         valid_cards.append(card.strip())
                 
                 if valid_cards:
-                    print(f"JSON extraction found {len(valid_cards)} cards")
+                    logger.debug(f"JSON extraction found {len(valid_cards)} cards")
                     return valid_cards
                 
         except (json.JSONDecodeError, ValueError, KeyError) as e:
-            print(f"JSON parsing failed: {e}")
-            print(f"Content that failed to parse: {content[:200]}...")
+            logger.warning(f"JSON parsing failed: {e}")
+            logger.debug(f"Content that failed to parse: {content[:200]}...")
         
         return []
 
     def _extract_cards_from_text(self, content: str) -> List[str]:
         """Extract cards from text using pattern matching."""
-        import re
-        
-        # Multiple extraction patterns to handle various formats
-        patterns = [
-            # Numbered lists with bold cards: "1. **Skullclamp** - description"
-            r'^\s*\d+\.?\s*\*?\*?([A-Z][a-zA-Z\s\',\-]+?)\*?\*?\s*[-–]',
-            
-            # Bold cards: **Card Name**
-            r'\*\*([A-Z][a-zA-Z\s\',\-]+?)\*\*',
-            
-            # Quoted cards: "Card Name"
-            r'["""]([A-Z][a-zA-Z\s\',\-]+?)["""]',
-            
-            # Cards after action keywords (more specific)
-            r'(?:recommend|suggest|include|consider|use|play|add|run)\s+([A-Z][a-zA-Z\s\',\-]{3,30}?)(?:\s+for|\s+to|\s|,|\.|\n|$)',
-            
-            # Cards mentioned with "along with": "along with Zur the Enchanter"
-            r'along\s+with\s+([A-Z][a-zA-Z\s\',\-]{3,30}?)(?:\s+and|\s|,|\.|\n|$)',
-            
-            # Cards alongside other cards: "alongside Korvold, Fae-Cursed King"
-            r'alongside\s+([A-Z][a-zA-Z\s\',\-]{3,30}?)(?:\s|,|\.|\n|$)',
-            
-            # Specific MTG phrases: "Swords to Plowshares", "Path to Exile"
-            r'\b([A-Z][a-zA-Z]+\s+to\s+[A-Z][a-zA-Z]+)\b',
-            
-            # Card names with common MTG suffixes
-            r'\b([A-Z][a-zA-Z]+(?:\s+the\s+[A-Z][a-zA-Z]+|clamp|signet|tower))\b',
-            
-            # Well-known card patterns (Conservative approach)
-            r'\b(Zur\s+the\s+Enchanter|Oloro,?\s+Ageless\s+Ascetic|Korvold,?\s+Fae-Cursed\s+King|Chulane,?\s+Teller\s+of\s+Tales|Skullclamp|Sol\s+Ring|Arcane\s+Signet|Command\s+Tower|Rhystic\s+Study|Smothering\s+Tithe|Cyclonic\s+Rift)\b',
-        ]
-        
         suggested_cards = []
+        seen = set()
         
-        for pattern in patterns:
-            matches = re.findall(pattern, content, re.MULTILINE | re.IGNORECASE)
-            
-            for match in matches:
-                card_name = match.strip().rstrip(',').rstrip('.').rstrip(':').strip()
+        # Multiple extraction patterns to handle various formats
+        for pattern in _TEXT_CARD_PATTERNS:
+            for match in pattern.finditer(content):
+                # The patterns never capture '.' or ':', so only commas need trimming
+                card_name = match.group(1).strip().rstrip(',').strip()
                 
-                if (self._is_valid_card_name(card_name) and 
-                    card_name not in suggested_cards):
+                if card_name not in seen and self._is_valid_card_name(card_name):
+                    seen.add(card_name)
                     suggested_cards.append(card_name)
+                    if len(suggested_cards) >= 20:  # Limit to reasonable number
+                        return suggested_cards
         
-        return suggested_cards[:20]  # Limit to reasonable number
+        return suggested_cards
 
     def _match_cards_in_database(self, ai_suggestions: List[str], all_card_names: List[str]) -> List[str]:
         """Match AI suggested cards with database cards using case-insensitive and fuzzy matching."""
@@ -1103,24 +1493,41 @@ STRICT REQUIREMENTS:
         
         matched_cards = []
         
+        # Index the names once: lowercased for exact lookups (first name wins),
+        # and by length for fuzzy matching
+        names_by_lower = {}
+        names_by_length = defaultdict(list)
+        for db_card in all_card_names:
+            names_by_lower.setdefault(db_card.lower(), db_card)
+            names_by_length[len(db_card)].append(db_card)
+        
         for ai_card in ai_suggestions:
             # Try exact case-insensitive match first
-            exact_matches = [db_card for db_card in all_card_names if db_card.lower() == ai_card.lower()]
+            exact_match = names_by_lower.get(ai_card.lower())
             
-            if exact_matches:
-                matched_cards.append(exact_matches[0])
-                print(f"Exact match: '{ai_card}' -> '{exact_matches[0]}'")
+            if exact_match is not None:
+                matched_cards.append(exact_match)
+                logger.debug(f"Exact match: '{ai_card}' -> '{exact_match}'")
                 continue
             
-            # Try fuzzy matching for typos
-            close_matches = get_close_matches(ai_card, all_card_names, n=1, cutoff=0.85)
+            # Try fuzzy matching for typos. Names whose length alone puts them
+            # under the cutoff (difflib's real_quick_ratio bound) can't match,
+            # so only the rest are compared.
+            size = len(ai_card)
+            candidates = [
+                db_card
+                for length, names in names_by_length.items()
+                if (2.0 * min(size, length) / (size + length) if size + length else 1.0) >= 0.85
+                for db_card in names
+            ]
+            close_matches = get_close_matches(ai_card, candidates, n=1, cutoff=0.85)
             
             if close_matches:
                 matched_cards.append(close_matches[0])
-                print(f"Fuzzy match: '{ai_card}' -> '{close_matches[0]}'")
+                logger.debug(f"Fuzzy match: '{ai_card}' -> '{close_matches[0]}'")
                 continue
                 
-            print(f"No match found for: '{ai_card}'")
+            logger.debug(f"No match found for: '{ai_card}'")
         
         return matched_cards
 
@@ -1128,27 +1535,18 @@ STRICT REQUIREMENTS:
         """Check if content is actually about Magic: The Gathering."""
         content_lower = content.lower()
         
-        # MTG-specific terms that should be present
-        mtg_keywords = [
-            'magic', 'commander', 'deck', 'mana', 'spell', 'artifact', 'creature',
-            'enchantment', 'planeswalker', 'sorcery', 'instant', 'land', 'tribal',
-            'mtg', 'edh', 'flying', 'token', 'draw', 'graveyard', 'battlefield',
-            'card draw', 'synergy', 'color identity', 'legendary', 'enters the battlefield'
-        ]
-        
-        # Non-MTG terms that indicate wrong content
-        bad_keywords = [
-            'programming', 'code', 'python', 'javascript', 'if statement', 'function',
-            'variable', 'print', 'class', 'method', 'spoiler alert', 'solution',
-            'challenge', 'algorithm', 'array', 'loop', 'tutorial', 'stackoverflow'
-        ]
-        
-        # Count MTG-related terms
-        mtg_count = sum(1 for keyword in mtg_keywords if keyword in content_lower)
-        bad_count = sum(1 for keyword in bad_keywords if keyword in content_lower)
+        # Content should have no bad terms...
+        if any(keyword in content_lower for keyword in _OFF_TOPIC_KEYWORDS):
+            return False
         
-        # Content should have MTG terms and minimal bad terms
-        return mtg_count >= 2 and bad_count == 0
+        # ...and at least two MTG terms; stop counting once both are found
+        mtg_count = 0
+        for keyword in _MTG_CONTENT_KEYWORDS:
+            if keyword in content_lower:
+                mtg_count += 1
+                if mtg_count >= 2:
+                    return True
+        return False
 
     def _log_query_value_assessment(self, commander_name: str, mechanics: str, cards_extracted: int, response_content: str):
         """Log assessment of Perplexity query value for cost optimization."""
@@ -1189,18 +1587,18 @@ STRICT REQUIREMENTS:
             value_level = "LOW_VALUE"
         
         # Log assessment
-        print(f"PERPLEXITY QUERY ASSESSMENT: {value_level}")
-        print(f"   Commander: {commander_name}")
-        print(f"   Mechanics: {mechanics}")
-        print(f"   Cards Extracted: {cards_extracted}")
-        print(f"   Value Score: {value_score}")
+        logger.info(f"PERPLEXITY QUERY ASSESSMENT: {value_level}")
+        logger.info(f"   Commander: {commander_name}")
+        logger.info(f"   Mechanics: {mechanics}")
+        logger.info(f"   Cards Extracted: {cards_extracted}")
+        logger.info(f"   Value Score: {value_score}")
         if issues:
-            print(f"   Issues: {', '.join(issues)}")
-        print(f"   Response Preview: {response_content[:150]}...")
+            logger.info(f"   Issues: {', '.join(issues)}")
+        logger.info(f"   Response Preview: {response_content[:150]}...")
         
         # Alert for consistently low-value queries
         if value_level == "LOW_VALUE":
-            print(f"🚨 LOW VALUE QUERY ALERT: Consider optimizing prompt or disabling for '{commander_name}' + '{mechanics}'")
+            logger.warning(f"🚨 LOW VALUE QUERY ALERT: Consider optimizing prompt or disabling for '{commander_name}' + '{mechanics}'")
 
 
 
@@ -1209,9 +1607,29 @@ STRICT REQUIREMENTS:
 # ===================================
 # This function runs in a separate process to score cards in parallel
 
+def _get_scoring_pool(num_workers: int) -> ProcessPoolExecutor:
+    """The shared scoring process pool, created on first use."""
+    global _scoring_pool
+    
+    with _scoring_pool_lock:
+        if _scoring_pool is None:
+            _scoring_pool = ProcessPoolExecutor(max_workers=num_workers)
+        return _scoring_pool
+
+
+def _discard_scoring_pool():
+    """Shut down the shared scoring pool so the next request starts a new one."""
+    global _scoring_pool
+    
+    with _scoring_pool_lock:
+        pool, _scoring_pool = _scoring_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
 def _score_batch_worker(card_items: List[Tuple[str, List[Dict]]], 
                        commander_dict: Dict, 
-                       current_deck: List[str],
+                       deck_categories: Dict[str, int],
                        budget_limit: Optional[float]) -> List:
     """
     Score a batch of cards (runs in a separate CPU process).
@@ -1222,7 +1640,7 @@ def _score_batch_worker(card_items: List[Tuple[str, List[Dict]]],
     Args:
         card_items: List of (card_name, versions) tuples to score
         commander_dict: Serialized commander data
-        current_deck: List of card names already in deck
+        deck_categories: Category counts of the current deck, from _categorize_deck
         budget_limit: Budget limit per card
     
     Returns:
@@ -1235,24 +1653,37 @@ def _score_batch_worker(card_items: List[Tuple[str, List[Dict]]],
     from data_engine.commander_recommender import CommanderRecommendationEngine
     recommender = CommanderRecommendationEngine(use_ai=False)  # No AI in worker process
     
-    # Score each card in the batch
-    scored = []
+    # Select the best version of each card in the batch
+    selected = []
     for card_name, versions in card_items:
         if not card_name:
             continue
         
         try:
-            # Select best version
-            best_version = recommender._select_best_version(versions, budget_limit)
-            
-            # Score the card
-            recommendation = recommender.score_card_for_commander(commander, best_version, current_deck)
+            selected.append((card_name, versions, recommender._select_best_version(versions, budget_limit)))
+        except Exception as e:
+            logger.error(f"Error scoring {card_name}: {e}")
+    
+    # Score the whole batch at once
+    try:
+        scored = recommender.score_cards_batch(
+            commander, [best_version for _, _, best_version in selected], deck_categories=deck_categories
+        )
+        for recommendation, (_, versions, _) in zip(scored, selected):
+            recommendation.all_versions = versions
+        return scored
+    except Exception as e:
+        logger.warning(f"Batch scoring failed ({e}), scoring cards individually")
+    
+    # Score each card on its own so one bad card does not drop the batch
+    scored = []
+    for card_name, versions, best_version in selected:
+        try:
+            recommendation = recommender.score_card_for_commander(commander, best_version, deck_categories=deck_categories)
             recommendation.all_versions = versions
-            
             scored.append(recommendation)
         except Exception as e:
-            print(f"Error scoring {card_name}: {e}")
-            continue
+            logger.error(f"Error scoring {card_name}: {e}")
     
     return scored
 
@@ -1273,4 +1704,5 @@ async def test_recommendation_engine():
 
 if __name__ == "__main__":
     import asyncio
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     asyncio.run(test_recommendation_engine())
\ No newline at end of file
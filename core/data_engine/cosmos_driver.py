@@ -7,8 +7,8 @@ from datetime import datetime, timedelta
 import threading
 import warnings
 import logging
-from pymongo import MongoClient
-from pymongo.errors import PyMongoError
+from pymongo import MongoClient, ReplaceOne
+from pymongo.errors import PyMongoError, BulkWriteError
 from dotenv import load_dotenv
 
 # Suppress CosmosDB connection warnings - they spam the logs on every connection
@@ -24,6 +24,23 @@ def get_mongo_client():
         raise RuntimeError("Missing Cosmos DB connection string in environment variables.")
     return MongoClient(conn_str)
 
+
+# MongoClient is thread-safe and pools its connections, so long-lived callers
+# share one instance instead of paying a new handshake per request
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+def get_shared_mongo_client():
+    """
+    Returns the process-wide MongoClient, creating it on first use.
+    """
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = get_mongo_client()
+    return _shared_client
+
 def add_card(collection, card_data):
     try:
         card_data['id'] = str(uuid.uuid4())  # Ensure each card has a unique ID
@@ -33,10 +50,60 @@ def add_card(collection, card_data):
         print(f"Failed to add card: {e}")
         sys.exit(1)
 
+def add_cards(collection, cards):
+    """
+    Insert many cards in one unordered bulk write, giving each a unique ID.
+    
+    A failed document does not stop the rest from being inserted.
+    Returns the number of cards inserted.
+    """
+    if not cards:
+        return 0
+    for card_data in cards:
+        card_data['id'] = str(uuid.uuid4())  # Ensure each card has a unique ID
+    try:
+        result = collection.insert_many(cards, ordered=False)
+        inserted = len(result.inserted_ids)
+    except BulkWriteError as e:
+        inserted = e.details.get('nInserted', 0)
+        print(f"Failed to add {len(e.details.get('writeErrors', []))} of {len(cards)} cards")
+    except PyMongoError as e:
+        print(f"Failed to add cards: {e}")
+        return 0
+    print(f"Added {inserted} cards")
+    return inserted
+
 def upsert_card(collection, card_data):
     # Upsert by 'id' (replace if exists, insert if not)
     collection.replace_one({'id': card_data['id']}, card_data, upsert=True)
 
+def ensure_card_id_index(collection):
+    """
+    Create the unique 'id' index that card upserts match on (a no-op if it exists).
+    Non-critical: if it cannot be created, e.g. because of duplicate ids, writes still work, just slower.
+    """
+    try:
+        collection.create_index([('id', 1)], unique=True)
+    except PyMongoError as e:
+        print(f"[INDEXES] Warning: Failed to create unique id index: {e}")
+
+def upsert_cards(collection, cards):
+    """
+    Upsert many cards by 'id' in one unordered bulk write.
+    
+    A failed card does not stop the rest of the batch.
+    Returns (upserted_count, write_errors).
+    """
+    if not cards:
+        return 0, []
+    operations = [ReplaceOne({'id': card_data['id']}, card_data, upsert=True) for card_data in cards]
+    try:
+        collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        write_errors = e.details.get('writeErrors', [])
+        return len(cards) - len(write_errors), write_errors
+    return len(cards), []
+
 def get_collection(client, db_name, collection_name):
     """
     Returns a collection object for the given database and collection name.
@@ -51,6 +118,29 @@ def get_collection(client, db_name, collection_name):
 # Solution: Cache cards in memory with 60-min TTL + thread-safe locking
 # Result: First load 2-3s, subsequent loads 0.05s (60x faster)
 
+# Card fields kept in the cache: what the recommender scores on and builds
+# commanders from, plus what the recommendations API returns per printing. Dropping the rest (per-format
+# legalities, purchase links, rulings URIs, ...) shrinks the transfer and the
+# resident cache several-fold.
+CARD_CACHE_PROJECTION = {
+    '_id': 0, 'id': 1, 'name': 1, 'mana_cost': 1, 'cmc': 1, 'colors': 1,
+    'color_identity': 1, 'type_line': 1, 'oracle_text': 1, 'rarity': 1,
+    'legalities.commander': 1, 'price': 1, 'image_uris': 1, 'released_at': 1,
+    'set': 1, 'set_name': 1, 'collector_number': 1,
+    'power': 1, 'toughness': 1, 'loyalty': 1
+}
+
+# Documents per getMore while streaming the cache load
+CARD_CACHE_BATCH_SIZE = 5000
+
+# Cached string fields with few distinct values across ~110k printings. They
+# are interned on load so each distinct value is stored once, and lookups
+# keyed on them (rarity tables, legality checks) can match by identity.
+CARD_CACHE_INTERNED_FIELDS = ('rarity', 'set', 'set_name', 'type_line', 'released_at')
+
+# Wait after a failed background reload before the next one is started
+CARD_CACHE_RETRY_DELAY = timedelta(minutes=1)
+
 class CardDatabaseCache:
     """
     Thread-safe in-memory cache for card database (Singleton pattern).
@@ -80,6 +170,8 @@ class CardDatabaseCache:
         self._last_refresh = None
         self._lock = threading.Lock()
         self.ttl = timedelta(minutes=ttl_minutes)
+        self._refreshing = False  # A background reload is running
+        self._generation = 0  # Bumped on invalidation so stale reloads are dropped
         self._initialized = True
     
     def get_all_cards(self):
@@ -88,6 +180,10 @@ class CardDatabaseCache:
         
         Thread-safe: Multiple threads can call this simultaneously.
         Uses double-checked locking pattern to minimize lock contention.
+        Once the TTL runs out, the expired cards keep being served while a
+        single background thread reloads them, so no request waits on the
+        hourly refresh; only the very first load (or one after invalidate)
+        blocks.
         
         Returns:
             list: All 110K+ card documents
@@ -95,35 +191,26 @@ class CardDatabaseCache:
         now = datetime.utcnow()
         
         # Fast path: Check if cache is valid (no lock needed)
-        if self._cache and self._last_refresh:
-            age = now - self._last_refresh
+        cards, last_refresh = self._cache, self._last_refresh
+        if cards and last_refresh:
+            age = now - last_refresh
             if age < self.ttl:
-                print(f"[CACHE HIT] Using cached cards ({len(self._cache)} cards, age: {age.seconds}s)")
-                return self._cache
+                print(f"[CACHE HIT] Using cached cards ({len(cards)} cards, age: {age.seconds}s)")
+                return cards
+            
+            # Expired: serve these cards while they are reloaded in the background
+            self._start_background_refresh()
+            return cards
         
-        # Slow path: Refresh cache (with lock)
+        # Slow path: Nothing cached yet, load now (with lock)
         with self._lock:
-            # Double-check in case another thread refreshed while waiting for lock
+            # Double-check in case another thread loaded while waiting for lock
             if self._cache and self._last_refresh:
-                age = now - self._last_refresh
-                if age < self.ttl:
-                    return self._cache
-            
-            # Load from database
-            print("[CACHE MISS] Refreshing card database cache from Cosmos DB...")
-            start_time = datetime.utcnow()
+                return self._cache
             
             try:
-                client = get_mongo_client()
-                cards_collection = client.mtgecorec.cards
-                
-                # Load all cards (projection excludes _id for smaller payload)
-                self._cache = list(cards_collection.find({}, {'_id': 0}))
+                self._cache = self._load_cards()
                 self._last_refresh = now
-                
-                elapsed = (datetime.utcnow() - start_time).total_seconds()
-                print(f"[CACHE LOADED] Loaded {len(self._cache)} cards in {elapsed:.2f}s")
-                
                 return self._cache
                 
             except Exception as e:
@@ -131,6 +218,63 @@ class CardDatabaseCache:
                 # Return empty list if database fails (allows app to continue)
                 return []
     
+    def _load_cards(self):
+        """Read every card from the database (cached fields only)."""
+        print("[CACHE MISS] Refreshing card database cache from Cosmos DB...")
+        start_time = datetime.utcnow()
+        
+        client = get_shared_mongo_client()
+        cards_collection = client.mtgecorec.cards
+        
+        # Stream all cards in large batches, fetching only the cached fields
+        cursor = cards_collection.find({}, CARD_CACHE_PROJECTION).batch_size(CARD_CACHE_BATCH_SIZE)
+        cards = list(cursor)
+        
+        intern = sys.intern
+        for card in cards:
+            for field in CARD_CACHE_INTERNED_FIELDS:
+                value = card.get(field)
+                if type(value) is str:
+                    card[field] = intern(value)
+            legalities = card.get('legalities')
+            if type(legalities) is dict and type(legalities.get('commander')) is str:
+                legalities['commander'] = intern(legalities['commander'])
+        
+        elapsed = (datetime.utcnow() - start_time).total_seconds()
+        print(f"[CACHE LOADED] Loaded {len(cards)} cards in {elapsed:.2f}s")
+        return cards
+    
+    def _start_background_refresh(self):
+        """Reload the cards on a daemon thread unless a reload is already running."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            generation = self._generation
+        
+        threading.Thread(target=self._background_refresh, args=(generation,), daemon=True).start()
+    
+    def _background_refresh(self, generation):
+        """Swap in freshly loaded cards; on failure the expired cards stay in use."""
+        try:
+            started = datetime.utcnow()
+            cards = self._load_cards()
+            with self._lock:
+                # Invalidated while loading: leave the next access to reload
+                if self._generation == generation:
+                    self._cache = cards
+                    self._last_refresh = started
+        except Exception as e:
+            print(f"[CACHE ERROR] Background refresh failed: {e}")
+            with self._lock:
+                # Keep serving the expired cards, and retry after a short delay
+                # rather than on the very next access
+                if self._generation == generation:
+                    self._last_refresh = datetime.utcnow() - self.ttl + CARD_CACHE_RETRY_DELAY
+        finally:
+            with self._lock:
+                self._refreshing = False
+    
     def invalidate(self):
         """
         Force cache refresh on next access.
@@ -141,6 +285,7 @@ class CardDatabaseCache:
         with self._lock:
             self._cache = None
             self._last_refresh = None
+            self._generation += 1
             print("[CACHE] Manual invalidation requested")
     
     def clear(self):
@@ -148,6 +293,7 @@ class CardDatabaseCache:
         with self._lock:
             self._cache = None
             self._last_refresh = None
+            self._generation += 1
     
     def get_cache_stats(self):
         """Return cache status for monitoring."""
@@ -537,6 +683,7 @@ def create_performance_indexes():
     4. type_line - For card type filtering (creatures, sorceries, etc.)
     5. Compound: colors + legalities.commander - For the most common query
     6. legalities.commander - For legal card filtering
+    7. Compound: legalities.commander + color_identity - For legal pools by identity
     
     Impact: 30-50% faster queries on large datasets
     """
@@ -569,6 +716,12 @@ def create_performance_indexes():
             ('legalities.commander', 1)
         ])
         
+        print("  - Creating compound index: legalities.commander + color_identity")
+        cards_collection.create_index([
+            ('legalities.commander', 1),
+            ('color_identity', 1)
+        ])
+        
         print("[INDEXES] All indexes created successfully!")
         print("[INDEXES] Tip: Indexes improve query performance by 30-50%")
         
@@ -1,5 +1,8 @@
 import os
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from dotenv import load_dotenv
 
@@ -9,6 +12,15 @@ load_dotenv()
 EXCHANGE_API_KEY = os.environ.get('EXCHANGE_API_KEY')
 BASE_URL = 'https://v6.exchangerate-api.com/v6'
 
+# Shared session so repeated calls reuse the pooled HTTPS connection
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=10,
+                                       max_retries=Retry(total=3, backoff_factor=0.3)))
+
+# Rates change at most hourly; successful lookups are reused for this long
+RATES_CACHE_TTL = 3600
+_rates_cache = {}  # base currency -> (fetched_at, rates)
+
 def test_auth():
     """
     Test if EXCHANGE_API_KEY is set and valid by making a simple API call.
@@ -19,7 +31,7 @@ def test_auth():
         return False
     url = f"{BASE_URL}/{EXCHANGE_API_KEY}/latest/USD"
     try:
-        response = requests.get(url)
+        response = _SESSION.get(url)
         response.raise_for_status()
         data = response.json()
         if data.get('result') == 'success':
@@ -36,17 +48,23 @@ def get_exchange_rates(base_currency='USD'):
     """
     Fetch latest exchange rates for the given base currency.
     Returns a dict of rates or None on error.
+    Results are cached per base currency for RATES_CACHE_TTL seconds.
     """
+    cached = _rates_cache.get(base_currency)
+    if cached and time.monotonic() - cached[0] < RATES_CACHE_TTL:
+        return cached[1]
     if not EXCHANGE_API_KEY:
         print("Error: EXCHANGE_API_KEY environment variable not set.")
         return None
     url = f"{BASE_URL}/{EXCHANGE_API_KEY}/latest/{base_currency}"
     try:
-        response = requests.get(url)
+        response = _SESSION.get(url)
         response.raise_for_status()
         data = response.json()
         if data.get('result') == 'success':
-            return data['conversion_rates']
+            rates = data['conversion_rates']
+            _rates_cache[base_currency] = (time.monotonic(), rates)
+            return rates
         else:
             print(f"API error: {data.get('error-type')}")
             return None
@@ -5,6 +5,8 @@ This module provides functions to fetch data from the JustTCG API.
 """
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 from dotenv import load_dotenv
@@ -18,6 +20,8 @@ class JustTCGClient:
         if not self.api_key:
             raise ValueError("JUSTTCG_API_KEY must be set in environment or passed to constructor.")
         self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=10,
+                                                   max_retries=Retry(total=3, backoff_factor=0.3)))
 
     def _get_headers(self):
         return {
@@ -1,37 +1,60 @@
 from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 # Main driver for pushing/pulling data from Cosmos DB
-from cosmos_driver import get_mongo_client, get_collection, add_card
+from cosmos_driver import get_shared_mongo_client, get_collection, add_card, add_cards
 from scryfall import get_card_by_name
 from exchange_rate import get_exchange_rates
 
 
 DATABASE_NAME = 'cards'
 CONTAINER_NAME = 'mtgecorec'
+# Concurrent Scryfall lookups; kept small to stay under Scryfall's rate limit
+SCRYFALL_FETCH_WORKERS = 8
 
-def pull_all_cards():
-	"""Fetch all cards from the Cosmos DB collection."""
-	client = get_mongo_client()
+def pull_all_cards(projection=None, batch_size=1000):
+	"""
+	Stream all cards from the Cosmos DB collection.
+	Returns a cursor so documents are fetched in batches as they are iterated;
+	pass a projection to limit the fields that are sent back.
+	"""
+	client = get_shared_mongo_client()
 	collection = get_collection(client, CONTAINER_NAME, DATABASE_NAME)
-	cards = list(collection.find({}, {'_id': 0}))
-	return cards
+	return collection.find({}, projection or {'_id': 0}, batch_size=batch_size)
 
 def insert_card_from_scryfall(card_name):
 	"""Fetch a card from Scryfall and insert it into Cosmos DB."""
 	card_data = get_card_by_name(card_name)
 	if card_data:
-		client = get_mongo_client()
+		client = get_shared_mongo_client()
 		collection = get_collection(client, CONTAINER_NAME, DATABASE_NAME)
 		add_card(collection, card_data)
 		print(f"Inserted card: {card_data['name']}")
 	else:
 		print(f"Card '{card_name}' not found on Scryfall.")
 
+def insert_cards_from_scryfall(card_names):
+	"""Fetch cards from Scryfall and insert the ones found into Cosmos DB in one batch."""
+	card_names = list(card_names)
+	with ThreadPoolExecutor(max_workers=max(1, min(SCRYFALL_FETCH_WORKERS, len(card_names)))) as executor:
+		fetched = list(executor.map(get_card_by_name, card_names))
+	found = []
+	for card_name, card_data in zip(card_names, fetched):
+		if card_data:
+			found.append(card_data)
+		else:
+			print(f"Card '{card_name}' not found on Scryfall.")
+	if found:
+		client = get_shared_mongo_client()
+		collection = get_collection(client, CONTAINER_NAME, DATABASE_NAME)
+		add_cards(collection, found)
+	return len(found)
+
 def create_exchange_rates_collection():
 	"""
 	Create an 'exchange_rates' database and 'rates' collection in Cosmos DB.
 	Returns the collection object.
 	"""
-	client = get_mongo_client()
+	client = get_shared_mongo_client()
 	db = client['exchange_rates']
 	collection = db['rates']
 	print("Exchange rates collection ready.")
@@ -45,7 +68,7 @@ def insert_exchange_rates(base_currency):
 	if not rates:
 		print("No rates to insert.")
 		return
-	client = get_mongo_client()
+	client = get_shared_mongo_client()
 	db = client['exchange_rates']
 	collection = db['rates']
 	doc = {
@@ -60,7 +83,7 @@ def pull_latest_exchange_rates(base_currency):
 	"""
 	Pull and print the most recently inserted exchange rates document from Cosmos DB.
 	"""
-	client = get_mongo_client()
+	client = get_shared_mongo_client()
 	db = client['exchange_rates']
 	collection = db['rates']
 	doc = collection.find_one(sort=[('inserted_at', -1)])
@@ -7,23 +7,47 @@ load_dotenv()
 
 import scrython
 import ijson
-import decimal
 import datetime
-from data_engine.cosmos_driver import get_mongo_client, get_collection, upsert_card
+import functools
+from data_engine.cosmos_driver import get_mongo_client, get_collection, upsert_cards, ensure_card_id_index
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning)
 import logging
 logging.getLogger("pymongo").setLevel(logging.ERROR)
+import re
 import time
 from pymongo.errors import BulkWriteError
 
+# insert_cards_to_cosmos: cards per insert_many (well under the 16MB message cap),
+# and how throttled writes are retried
+INSERT_BATCH_SIZE = int(os.environ.get('SCRYFALL_INSERT_BATCH_SIZE', '1000'))
+THROTTLE_ERROR_CODES = (16500, 429)  # Cosmos DB "request rate is large"
+MAX_THROTTLE_RETRIES = 5
+
+@functools.lru_cache(maxsize=4096)
+def _named_card(card_name):
+	"""Scryfall JSON for a fuzzy name lookup; memoized (failures raise, so are not cached). Do not mutate."""
+	return scrython.cards.Named(fuzzy=card_name).scryfallJson
+
+@functools.lru_cache(maxsize=4096)
+def _printings(card_name):
+	"""Scryfall JSON for every printing of an exact name; memoized like _named_card. Do not mutate."""
+	all_cards = []
+	search = scrython.cards.Search(q=f'!"{card_name}"')
+	all_cards.extend(search.data())
+	# Use next_page_uri to fetch all pages
+	while getattr(search, 'next_page_uri', None):
+		search = scrython.cards.Search(url=search.next_page_uri)
+		all_cards.extend(search.data())
+	return tuple(all_cards)
+
 def get_card_by_name(card_name):
 	"""
 	Fetch a card by name (fuzzy match). Returns a dict with all available fields from Scryfall.
+	Lookups are cached per name; each call gets its own copy of the card dict.
 	"""
 	try:
-		card = scrython.cards.Named(fuzzy=card_name)
-		return card.scryfallJson
+		return dict(_named_card(card_name))
 	except Exception as e:
 		print(f"Error fetching card: {e}")
 		return None
@@ -32,16 +56,10 @@ def get_all_printings(card_name):
 	"""
 	Fetch all printings of a card by exact name. Returns a list of dicts (all available fields).
 	Uses Scryfall's search: !"Card Name"
+	Lookups are cached per name; each call gets its own copies of the card dicts.
 	"""
 	try:
-		all_cards = []
-		search = scrython.cards.Search(q=f'!"{card_name}"')
-		all_cards.extend(search.data())
-		# Use next_page_uri to fetch all pages
-		while getattr(search, 'next_page_uri', None):
-			search = scrython.cards.Search(url=search.next_page_uri)
-			all_cards.extend(search.data())
-		return all_cards
+		return [dict(card) for card in _printings(card_name)]
 	except Exception as e:
 		print(f"Error fetching printings: {e}")
 		return []
@@ -52,48 +70,46 @@ def stream_bulk_cards(json_path, set_code=None):
     Generator that yields cards from the Scryfall bulk file, optionally filtered by set_code.
     """
     with open(json_path, 'rb') as f:
-        cards = ijson.items(f, 'item')
+        # use_float: numbers come back as floats, not Decimals that need converting
+        cards = ijson.items(f, 'item', use_float=True)
         for card in cards:
             if set_code and card.get('set') != set_code:
                 continue
             yield card
 
-def convert_decimals(obj):
-    if isinstance(obj, list):
-        return [convert_decimals(i) for i in obj]
-    elif isinstance(obj, dict):
-        return {k: convert_decimals(v) for k, v in obj.items()}
-    elif isinstance(obj, decimal.Decimal):
-        return float(obj)
-    else:
-        return obj
+def _upsert_batch(collection, batch, batch_num):
+    """
+    Upsert one batch of cards with a single bulk write.
+    Returns (success_count, fail_count).
+    """
+    try:
+        success_count, write_errors = upsert_cards(collection, batch)
+    except Exception as e:
+        print(f"\nBatch {batch_num}: Upsert error: {e}")
+        return 0, len(batch)
+    for error in write_errors:
+        print(f"\nBatch {batch_num}: Upsert error: {error.get('errmsg')}")
+    return success_count, len(write_errors)
 
 def upload_cards_to_cosmos(cards, batch_size=500, day_uploaded=None, total_count=None):
     """
     Upserts cards to Cosmos DB in batches, adding a day_uploaded field.
+    Cards must already be BSON-encodable (stream_bulk_cards yields floats, not Decimals).
     """
     client = get_mongo_client()
     collection = get_collection(client, 'mtgecorec', 'cards')
+    ensure_card_id_index(collection)
     today = day_uploaded or datetime.date.today().isoformat()
     batch = []
     total_success = 0
     total_failed = 0
     batch_num = 0
     for card in cards:
-        card = convert_decimals(card)
         card['day_uploaded'] = today
         batch.append(card)
         if len(batch) >= batch_size:
             batch_num += 1
-            success_count = 0
-            fail_count = 0
-            for c in batch:
-                try:
-                    upsert_card(collection, c)
-                    success_count += 1
-                except Exception as e:
-                    fail_count += 1
-                    print(f"\nBatch {batch_num}: Upsert error: {e}")
+            success_count, fail_count = _upsert_batch(collection, batch, batch_num)
             total_success += success_count
             total_failed += fail_count
             if total_count:
@@ -104,15 +120,7 @@ def upload_cards_to_cosmos(cards, batch_size=500, day_uploaded=None, total_count
             batch = []
     if batch:
         batch_num += 1
-        success_count = 0
-        fail_count = 0
-        for c in batch:
-            try:
-                upsert_card(collection, c)
-                success_count += 1
-            except Exception as e:
-                fail_count += 1
-                print(f"\nBatch {batch_num}: Upsert error: {e}")
+        success_count, fail_count = _upsert_batch(collection, batch, batch_num)
         total_success += success_count
         total_failed += fail_count
         if total_count:
@@ -125,39 +133,64 @@ def upload_cards_to_cosmos(cards, batch_size=500, day_uploaded=None, total_count
         print(f"Total failed upserts: {total_failed} cards.")
 
 
-def insert_cards_to_cosmos(cards, batch_size=50, day_uploaded=None, total_count=None):
+def _retry_after_seconds(write_error, attempt):
+    """
+    How long to wait before retrying a throttled insert: the RetryAfterMs
+    Cosmos DB reports, or an exponential backoff when it gives none.
+    """
+    match = re.search(r'RetryAfterMs=(\d+)', write_error.get('errmsg', ''))
+    if match:
+        return int(match.group(1)) / 1000
+    return 0.1 * 2 ** attempt
+
+def _insert_batch(collection, batch, batch_num):
+    """
+    Insert one batch with insert_many, retrying only the documents Cosmos DB
+    throttled (other write errors are counted as failures).
+    Returns (success_count, fail_count).
+    """
+    success_count = 0
+    pending = batch
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        try:
+            result = collection.insert_many(pending, ordered=False)
+            success_count += len(result.inserted_ids)
+            break
+        except BulkWriteError as bwe:
+            # Count successful inserts from error details
+            success_count += bwe.details.get('nInserted', 0)
+            throttled = [error for error in bwe.details.get('writeErrors', [])
+                         if error.get('code') in THROTTLE_ERROR_CODES]
+            if not throttled or attempt == MAX_THROTTLE_RETRIES:
+                break
+            time.sleep(max(_retry_after_seconds(error, attempt) for error in throttled))
+            pending = [pending[error['index']] for error in throttled]
+    fail_count = len(batch) - success_count
+    if fail_count:
+        print(f"\nBatch {batch_num}: Bulk write error. Inserted {success_count}, Failed {fail_count}.", flush=True)
+    return success_count, fail_count
+
+def insert_cards_to_cosmos(cards, batch_size=INSERT_BATCH_SIZE, day_uploaded=None, total_count=None):
     """
     Fast initial upload: insert cards in batches using insert_many (no deduplication).
     Use only when the collection is empty!
+    Cards must already be BSON-encodable (stream_bulk_cards yields floats, not Decimals).
     Shows % complete if total_count is provided.
     """
     client = get_mongo_client()
     collection = get_collection(client, 'mtgecorec', 'cards')
+    ensure_card_id_index(collection)
     today = day_uploaded or datetime.date.today().isoformat()
     batch = []
     total_success = 0
     total_failed = 0
     batch_num = 0
     for card in cards:
-        card = convert_decimals(card)
         card['day_uploaded'] = today
         batch.append(card)
         if len(batch) >= batch_size:
             batch_num += 1
-            try:
-                for c in batch:
-                    if 'day_uploaded' not in c:
-                        c['day_uploaded'] = today
-                result = collection.insert_many(batch, ordered=False)
-                success_count = len(result.inserted_ids)
-                fail_count = len(batch) - success_count
-            except BulkWriteError as bwe:
-                # Count successful inserts from error details
-                success_count = bwe.details.get('nInserted', 0)
-                fail_count = len(batch) - success_count
-                print(f"\nBatch {batch_num}: Bulk write error. Inserted {success_count}, Failed {fail_count}.", flush=True)
-            else:
-                fail_count = 0
+            success_count, fail_count = _insert_batch(collection, batch, batch_num)
             total_success += success_count
             total_failed += fail_count
             if total_count:
@@ -166,22 +199,9 @@ def insert_cards_to_cosmos(cards, batch_size=50, day_uploaded=None, total_count=
             else:
                 print(f"Inserted {total_success} cards...", end="\r", flush=True)
             batch = []
-            time.sleep(0.1)
     if batch:
         batch_num += 1
-        try:
-            for c in batch:
-                if 'day_uploaded' not in c:
-                    c['day_uploaded'] = today
-            result = collection.insert_many(batch, ordered=False)
-            success_count = len(result.inserted_ids)
-            fail_count = len(batch) - success_count
-        except BulkWriteError as bwe:
-            success_count = bwe.details.get('nInserted', 0)
-            fail_count = len(batch) - success_count
-            print(f"\nBatch {batch_num}: Bulk write error. Inserted {success_count}, Failed {fail_count}.")
-        else:
-            fail_count = 0
+        success_count, fail_count = _insert_batch(collection, batch, batch_num)
         total_success += success_count
         total_failed += fail_count
         if total_count:
@@ -193,13 +213,10 @@ def insert_cards_to_cosmos(cards, batch_size=50, day_uploaded=None, total_count=
     if total_failed > 0:
         print(f"Total failed inserts: {total_failed} cards.")
 
-
 if __name__ == "__main__":
-    import json
     BULK_FILE = 'data_engine/scryfall-default-cards.json'
-    # Count total cards for progress reporting
-    with open(BULK_FILE, 'r', encoding='utf-8') as f:
-        total_count = sum(1 for _ in json.load(f))
+    # Count total cards for progress reporting (streamed, so the file is never fully in memory)
+    total_count = sum(1 for _ in stream_bulk_cards(BULK_FILE))
 
     print("Streaming and upserting all cards...")
     cards = stream_bulk_cards(BULK_FILE, set_code=None)
@@ -1,12 +1,11 @@
 # default data from: https://scryfall.com/docs/api/bulk-data
 
-import decimal
 import json
 import ijson
 import datetime
 from pymongo import MongoClient
 from pymongo.errors import BulkWriteError
-from cosmos_driver import get_mongo_client, get_collection, upsert_card
+from cosmos_driver import get_mongo_client, get_collection, upsert_cards, ensure_card_id_index
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -16,41 +15,35 @@ BATCH_SIZE = 500
 DATABASE_NAME = 'cards'
 CONTAINER_NAME = 'mtgecorec'
 
-def convert_decimals(obj):
-    """Recursively convert Decimal values to float in dicts/lists."""
-    if isinstance(obj, list):
-        return [convert_decimals(i) for i in obj]
-    elif isinstance(obj, dict):
-        return {k: convert_decimals(v) for k, v in obj.items()}
-    elif isinstance(obj, decimal.Decimal):
-        return float(obj)
-    else:
-        return obj
+def upsert_batch(collection, batch):
+    """Upsert a batch of cards in one bulk write, reporting any that failed."""
+    _, write_errors = upsert_cards(collection, batch)
+    for error in write_errors:
+        print(f"Upsert error: {error.get('errmsg')}")
 
 
 def stream_and_upload_cards(json_path, batch_size=500):
     client = get_mongo_client()
     collection = get_collection(client, CONTAINER_NAME, DATABASE_NAME)
+    ensure_card_id_index(collection)
     today = datetime.date.today().isoformat()
     with open(json_path, 'rb') as f:
-        # Scryfall bulk file is a JSON array of card objects
-        cards = ijson.items(f, 'item')
+        # Scryfall bulk file is a JSON array of card objects; use_float parses
+        # numbers straight to float, so cards need no Decimal conversion pass
+        cards = ijson.items(f, 'item', use_float=True)
         batch = []
         count = 0
         for card in cards:
-            card = convert_decimals(card)
             card['day_uploaded'] = today
             batch.append(card)
             if len(batch) >= batch_size:
-                for c in batch:
-                    upsert_card(collection, c)
+                upsert_batch(collection, batch)
                 count += len(batch)
                 print(f"Upserted {count} cards...")
                 batch = []
         # Insert any remaining cards
         if batch:
-            for c in batch:
-                upsert_card(collection, c)
+            upsert_batch(collection, batch)
             count += len(batch)
             print(f"Upserted {count} cards (final batch). Done!")
 
@@ -5,9 +5,11 @@ This module provides algorithms to identify card synergies based on mechanics,
 types, themes, and Commander strategies.
 """
 import re
+import sys
+import numpy as np
 from typing import List, Dict, Set, Optional, Tuple, Any
 from dataclasses import dataclass
-from collections import defaultdict, Counter
+from collections import Counter
 from .commander_model import CommanderCard, ColorIdentity
 
 
@@ -21,6 +23,102 @@ class SynergyScore:
     category: str  # 'mechanical', 'thematic', 'tribal', 'combo', etc.
 
 
+@dataclass(frozen=True)
+class CardFeatures:
+    """Synergy features extracted once from a card's oracle text and type line."""
+    text_lower: str
+    type_lower: str
+    mechanics: Set[str]
+    tribes: Set[str]
+    themes: Dict[str, float]
+    mechanic_bits: int = 0  # bit k set for mechanic id k
+    tribe_bits: int = 0  # bit k set for tribe id k
+    mention_bits: int = 0  # tribes whose name appears in the oracle text
+
+
+# Upper bound on memoized card features; the cache is simply reset when full
+FEATURE_CACHE_SIZE = 4096
+
+# Mechanic pairs that reinforce each other, stored in both orders so a single
+# membership test covers either card contributing either half of the pair
+_COMPLEMENTARY_PAIRS = frozenset({
+    ('lifegain', 'draw_cards'),
+    ('mill', 'return_battlefield'),
+    ('sacrifice', 'dies'),
+    ('etb', 'return_hand'),
+    ('tokens', 'sacrifice'),
+    ('counters', 'proliferate'),
+    ('artifacts', 'sacrifice'),
+    ('graveyard', 'mill')
+})
+_COMPLEMENTARY_PAIRS |= {(b, a) for a, b in _COMPLEMENTARY_PAIRS}
+
+# mechanic -> mechanics it complements, so pairs are found by set intersection
+_COMPLEMENTS: Dict[str, frozenset] = {}
+for _a, _b in _COMPLEMENTARY_PAIRS:
+    _COMPLEMENTS[_a] = _COMPLEMENTS.get(_a, frozenset()) | {_b}
+del _a, _b
+
+# Ability patterns that mark a mechanic in lowercased oracle text
+_MECHANIC_PATTERNS = [(mechanic, re.compile(pattern)) for mechanic, pattern in {
+    'etb': r'when .* enters the battlefield',
+    'dies': r'when .* dies',
+    'attack': r'when .* attacks',
+    'deal_damage': r'deals? \d+ damage',
+    'draw_cards': r'draw \d+ cards?',
+    'gain_life': r'gain \d+ life',
+    'mill': r'mill \d+',
+    'scry': r'scry \d+',
+    'counter_spell': r'counter target spell',
+    'destroy': r'destroy target',
+    'exile': r'exile target',
+    'return_hand': r'return .* to .* hand',
+    'return_battlefield': r'return .* to the battlefield',
+    'search_library': r'search your library',
+    'discard': r'discard',
+    'sacrifice': r'sacrifice',
+    'tap': r'tap target',
+    'untap': r'untap',
+    'create_token': r'create .* token',
+    'copy': r'copy target',
+    'double': r'double',
+    'additional_turn': r'extra turn',
+    'cant_block': r"can't block",
+    'cant_attack': r"can't attack",
+    'protection': r'protection from',
+    'ward': r'ward',
+    'hexproof': r'hexproof',
+    'shroud': r'shroud'
+}.items()]
+
+# Known combo patterns: (tokens for the first card, tokens for the second, description)
+_COMBO_PATTERNS = [
+    # Infinite mana combos
+    (['untap', 'mana'], ['tap', 'mana'], "Infinite mana potential"),
+    # Infinite creatures
+    (['create', 'token'], ['sacrifice', 'create'], "Infinite creature generation"),
+    # Infinite card draw
+    (['draw', 'card'], ['discard', 'draw'], "Infinite card draw engine"),
+    # Infinite damage
+    (['damage', 'deal'], ['untap', 'damage'], "Infinite damage combo"),
+    # Infinite turns
+    (['extra turn'], ['return', 'hand'], "Infinite turns"),
+]
+
+# Every combo token gets a bit, and each pattern side becomes a bitmask over them
+_COMBO_TOKENS = sorted({token for side1, side2, _ in _COMBO_PATTERNS for token in side1 + side2})
+_COMBO_MASKS = [
+    (sum(1 << _COMBO_TOKENS.index(t) for t in side1),
+     sum(1 << _COMBO_TOKENS.index(t) for t in side2),
+     description)
+    for side1, side2, description in _COMBO_PATTERNS
+]
+
+# Slack when preselecting on vectorized scores, which may differ from the
+# reported SynergyScore values by float rounding
+_SCORE_TOLERANCE = 1e-9
+
+
 class SynergyAnalyzer:
     """Analyzes card synergies for Commander deck building."""
     
@@ -63,13 +161,33 @@ class SynergyAnalyzer:
             'enter_battlefield': ['enters the battlefield', 'etb', 'when ~ enters'],
             'planeswalkers': ['planeswalker', 'loyalty', 'superfriends']
         }
+        
+        # Small integer ids for every mechanic and tribe, so feature sets can be
+        # stored as bitmasks and intersected with a single AND
+        mechanic_names = self.keywords | {mechanic for mechanic, _ in _MECHANIC_PATTERNS}
+        self._mechanic_ids = {sys.intern(m): k for k, m in enumerate(sorted(mechanic_names))}
+        self._tribe_ids = {sys.intern(t): k for k, t in enumerate(sorted(self.tribes))}
+        self._theme_ids = {theme: k for k, theme in enumerate(self.themes)}
+        
+        # Complementary mechanics as a bitmask per mechanic id (and as a matrix)
+        self._complement_bits = [0] * len(self._mechanic_ids)
+        self._complement_matrix = np.zeros((len(self._mechanic_ids),) * 2, dtype=np.float64)
+        for a, b in _COMPLEMENTARY_PAIRS:
+            if a in self._mechanic_ids and b in self._mechanic_ids:
+                self._complement_bits[self._mechanic_ids[a]] |= 1 << self._mechanic_ids[b]
+                self._complement_matrix[self._mechanic_ids[a], self._mechanic_ids[b]] = 1
+        
+        # Features keyed on (oracle_text, type_line) so repeated cards are parsed once
+        self._feature_cache: Dict[Tuple[str, str], CardFeatures] = {}
     
     def extract_mechanics(self, card_text: str) -> Set[str]:
         """Extract mechanics and keywords from card text."""
         if not card_text:
             return set()
-            
-        text = card_text.lower()
+        return self._extract_mechanics_lc(card_text.lower())
+    
+    def _extract_mechanics_lc(self, text: str) -> Set[str]:
+        """extract_mechanics for text that is already lowercased."""
         mechanics = set()
         
         # Find keywords
@@ -78,178 +196,215 @@ class SynergyAnalyzer:
                 mechanics.add(keyword)
         
         # Find abilities with patterns
-        patterns = {
-            'etb': r'when .* enters the battlefield',
-            'dies': r'when .* dies',
-            'attack': r'when .* attacks',
-            'deal_damage': r'deals? \d+ damage',
-            'draw_cards': r'draw \d+ cards?',
-            'gain_life': r'gain \d+ life',
-            'mill': r'mill \d+',
-            'scry': r'scry \d+',
-            'counter_spell': r'counter target spell',
-            'destroy': r'destroy target',
-            'exile': r'exile target',
-            'return_hand': r'return .* to .* hand',
-            'return_battlefield': r'return .* to the battlefield',
-            'search_library': r'search your library',
-            'discard': r'discard',
-            'sacrifice': r'sacrifice',
-            'tap': r'tap target',
-            'untap': r'untap',
-            'create_token': r'create .* token',
-            'copy': r'copy target',
-            'double': r'double',
-            'additional_turn': r'extra turn',
-            'cant_block': r"can't block",
-            'cant_attack': r"can't attack",
-            'protection': r'protection from',
-            'ward': r'ward',
-            'hexproof': r'hexproof',
-            'shroud': r'shroud'
-        }
-        
-        for mechanic, pattern in patterns.items():
-            if re.search(pattern, text):
+        for mechanic, pattern in _MECHANIC_PATTERNS:
+            if pattern.search(text):
                 mechanics.add(mechanic)
         
         return mechanics
     
     def extract_tribes(self, type_line: str, card_text: str) -> Set[str]:
         """Extract creature types and tribal references."""
+        return self._extract_tribes_lc((type_line or '').lower(), (card_text or '').lower())
+    
+    def _extract_tribes_lc(self, type_text: str, text: str) -> Set[str]:
+        """extract_tribes for a type line and text that are already lowercased."""
         tribes = set()
         
-        if type_line:
-            type_text = type_line.lower()
+        if type_text:
             for tribe in self.tribes:
                 if tribe in type_text:
                     tribes.add(tribe)
         
-        if card_text:
-            text = card_text.lower()
+        if text:
             for tribe in self.tribes:
-                # Look for tribal references in text
-                if f"{tribe}s" in text or tribe in text:
+                # Look for tribal references in text (plurals contain the singular)
+                if tribe in text:
                     tribes.add(tribe)
         
         return tribes
     
     def extract_themes(self, card_text: str, type_line: str) -> Dict[str, float]:
         """Extract thematic elements and assign relevance scores."""
-        themes = defaultdict(float)
+        return self._extract_themes_lc((card_text or '').lower(), (type_line or '').lower())
+    
+    def _extract_themes_lc(self, text: str, type_text: str) -> Dict[str, float]:
+        """extract_themes for a text and type line that are already lowercased."""
+        themes = {}
         
-        if not card_text:
+        if not text:
             return themes
         
-        text = card_text.lower()
-        type_text = type_line.lower() if type_line else ""
+        count_text = text.count
+        count_type = type_text.count if type_text else None
         
         for theme_name, keywords in self.themes.items():
-            score = 0.0
-            
-            for keyword in keywords:
-                # Count occurrences in text
-                text_count = text.count(keyword)
-                type_count = type_text.count(keyword)
-                
-                # Weight differently based on where it appears
-                score += text_count * 0.8 + type_count * 1.0
+            # Tally keyword occurrences; type line hits weigh more than text hits
+            text_count = sum(map(count_text, keywords))
+            type_count = sum(map(count_type, keywords)) if count_type else 0
             
-            if score > 0:
+            if text_count or type_count:
+                score = text_count * 0.8 + type_count * 1.0
                 themes[theme_name] = min(score, 3.0) / 3.0  # Normalize to 0-1
         
-        return dict(themes)
+        return themes
+    
+    @staticmethod
+    def _to_bits(names, ids: Dict[str, int]) -> int:
+        """Pack a collection of names into a bitmask of their ids."""
+        bits = 0
+        for name in names:
+            bits |= 1 << ids[name]
+        return bits
+    
+    def _featurize(self, card: Dict[str, Any]) -> CardFeatures:
+        """Extract (and memoize) the synergy features of a card."""
+        oracle_text = card.get('oracle_text', '') or ''
+        type_line = card.get('type_line', '') or ''
+        key = (oracle_text, type_line)
+        
+        features = self._feature_cache.get(key)
+        if features is None:
+            # Lowercase once and share the result across all extractors
+            text_lower = oracle_text.lower()
+            type_lower = type_line.lower()
+            mechanics = self._extract_mechanics_lc(text_lower) if text_lower else set()
+            tribes = self._extract_tribes_lc(type_lower, text_lower)
+            features = CardFeatures(
+                text_lower=text_lower,
+                type_lower=type_lower,
+                mechanics=mechanics,
+                tribes=tribes,
+                themes=self._extract_themes_lc(text_lower, type_lower),
+                mechanic_bits=self._to_bits(mechanics, self._mechanic_ids),
+                tribe_bits=self._to_bits(tribes, self._tribe_ids),
+                mention_bits=self._to_bits((t for t in self.tribes if t in text_lower), self._tribe_ids)
+            )
+            if len(self._feature_cache) >= FEATURE_CACHE_SIZE:
+                self._feature_cache.clear()
+            self._feature_cache[key] = features
+        
+        return features
     
     def calculate_mechanical_synergy(self, card1: Dict[str, Any], card2: Dict[str, Any]) -> SynergyScore:
         """Calculate synergy score based on mechanical interactions."""
-        name1 = card1.get('name', '')
-        name2 = card2.get('name', '')
-        
-        mechanics1 = self.extract_mechanics(card1.get('oracle_text', ''))
-        mechanics2 = self.extract_mechanics(card2.get('oracle_text', ''))
+        return self._mechanical_synergy_from_feats(
+            card1.get('name', ''), self._featurize(card1),
+            card2.get('name', ''), self._featurize(card2)
+        )
+    
+    def _mechanical_synergy_from_feats(self, name1: str, feats1: CardFeatures,
+                                       name2: str, feats2: CardFeatures) -> SynergyScore:
+        """Mechanical synergy between two already-featurized cards."""
+        score, reasons = self._mechanical_parts(name1, feats1, name2, feats2)
+        return SynergyScore(
+            primary_card=name1,
+            synergy_card=name2,
+            score=score,
+            reasons=reasons,
+            category='mechanical'
+        )
+    
+    def _mechanical_parts(self, name1: str, feats1: CardFeatures,
+                          name2: str, feats2: CardFeatures) -> Tuple[float, List[str]]:
+        """Raw mechanical score and reasons, without building a SynergyScore."""
+        mechanics1 = feats1.mechanics
+        mechanics2 = feats2.mechanics
         
         # Find shared mechanics
-        shared_mechanics = mechanics1 & mechanics2
-        complementary_pairs = {
-            ('lifegain', 'draw_cards'),
-            ('mill', 'return_battlefield'),
-            ('sacrifice', 'dies'),
-            ('etb', 'return_hand'),
-            ('tokens', 'sacrifice'),
-            ('counters', 'proliferate'),
-            ('artifacts', 'sacrifice'),
-            ('graveyard', 'mill')
-        }
+        shared_count = (feats1.mechanic_bits & feats2.mechanic_bits).bit_count()
         
         score = 0.0
         reasons = []
         
         # Shared mechanics bonus
-        if shared_mechanics:
-            score += len(shared_mechanics) * 0.2
-            reasons.append(f"Shared mechanics: {', '.join(shared_mechanics)}")
-        
-        # Complementary mechanics
-        for mech1 in mechanics1:
-            for mech2 in mechanics2:
-                if (mech1, mech2) in complementary_pairs or (mech2, mech1) in complementary_pairs:
+        if shared_count:
+            score += shared_count * 0.2
+            reasons.append(f"Shared mechanics: {', '.join(mechanics1 & mechanics2)}")
+        
+        # Complementary mechanics: only mechanics with a known partner are visited
+        if feats1.mechanic_bits and feats2.mechanic_bits:
+            for mech1 in mechanics1 & _COMPLEMENTS.keys():
+                for mech2 in mechanics2 & _COMPLEMENTS[mech1]:
                     score += 0.3
                     reasons.append(f"Complementary: {mech1} + {mech2}")
         
+        return min(score, 1.0), reasons
+    
+    def calculate_tribal_synergy(self, card1: Dict[str, Any], card2: Dict[str, Any]) -> SynergyScore:
+        """Calculate synergy score based on tribal interactions."""
+        return self._tribal_synergy_from_feats(
+            card1.get('name', ''), self._featurize(card1),
+            card2.get('name', ''), self._featurize(card2)
+        )
+    
+    def _tribal_synergy_from_feats(self, name1: str, feats1: CardFeatures,
+                                   name2: str, feats2: CardFeatures) -> SynergyScore:
+        """Tribal synergy between two already-featurized cards."""
+        score, reasons = self._tribal_parts(name1, feats1, name2, feats2)
         return SynergyScore(
             primary_card=name1,
             synergy_card=name2,
-            score=min(score, 1.0),
+            score=score,
             reasons=reasons,
-            category='mechanical'
+            category='tribal'
         )
     
-    def calculate_tribal_synergy(self, card1: Dict[str, Any], card2: Dict[str, Any]) -> SynergyScore:
-        """Calculate synergy score based on tribal interactions."""
-        name1 = card1.get('name', '')
-        name2 = card2.get('name', '')
-        
-        tribes1 = self.extract_tribes(card1.get('type_line', ''), card1.get('oracle_text', ''))
-        tribes2 = self.extract_tribes(card2.get('type_line', ''), card2.get('oracle_text', ''))
-        
-        shared_tribes = tribes1 & tribes2
+    def _tribal_parts(self, name1: str, feats1: CardFeatures,
+                      name2: str, feats2: CardFeatures) -> Tuple[float, List[str]]:
+        """Raw tribal score and reasons, without building a SynergyScore."""
+        tribes1 = feats1.tribes
+        tribes2 = feats2.tribes
+        bits1 = feats1.tribe_bits
+        bits2 = feats2.tribe_bits
         
         score = 0.0
         reasons = []
         
-        if shared_tribes:
-            score = len(shared_tribes) * 0.4
-            reasons.append(f"Shared tribes: {', '.join(shared_tribes)}")
-        
-        # Tribal support (one card supports the other's tribe)
-        text1 = card1.get('oracle_text', '').lower()
-        text2 = card2.get('oracle_text', '').lower()
-        
-        for tribe in tribes1:
-            if tribe in text2 and tribe not in shared_tribes:
-                score += 0.6
-                reasons.append(f"{name2} supports {tribe}s")
-        
-        for tribe in tribes2:
-            if tribe in text1 and tribe not in shared_tribes:
-                score += 0.6
-                reasons.append(f"{name1} supports {tribe}s")
-        
+        shared_count = (bits1 & bits2).bit_count()
+        if shared_count:
+            score = shared_count * 0.4
+            reasons.append(f"Shared tribes: {', '.join(tribes1 & tribes2)}")
+        
+        # Tribal support (one card supports the other's tribe): a tribe of one
+        # card that the other card's text mentions without having it itself
+        if bits1 & feats2.mention_bits & ~bits2:
+            for tribe in tribes1 - tribes2:
+                if tribe in feats2.text_lower:
+                    score += 0.6
+                    reasons.append(f"{name2} supports {tribe}s")
+        
+        if bits2 & feats1.mention_bits & ~bits1:
+            for tribe in tribes2 - tribes1:
+                if tribe in feats1.text_lower:
+                    score += 0.6
+                    reasons.append(f"{name1} supports {tribe}s")
+        
+        return min(score, 1.0), reasons
+    
+    def calculate_thematic_synergy(self, card1: Dict[str, Any], card2: Dict[str, Any]) -> SynergyScore:
+        """Calculate synergy score based on thematic coherence."""
+        return self._thematic_synergy_from_feats(
+            card1.get('name', ''), self._featurize(card1),
+            card2.get('name', ''), self._featurize(card2)
+        )
+    
+    def _thematic_synergy_from_feats(self, name1: str, feats1: CardFeatures,
+                                     name2: str, feats2: CardFeatures) -> SynergyScore:
+        """Thematic synergy between two already-featurized cards."""
+        score, reasons = self._thematic_parts(name1, feats1, name2, feats2)
         return SynergyScore(
             primary_card=name1,
             synergy_card=name2,
-            score=min(score, 1.0),
+            score=score,
             reasons=reasons,
-            category='tribal'
+            category='thematic'
         )
     
-    def calculate_thematic_synergy(self, card1: Dict[str, Any], card2: Dict[str, Any]) -> SynergyScore:
-        """Calculate synergy score based on thematic coherence."""
-        name1 = card1.get('name', '')
-        name2 = card2.get('name', '')
-        
-        themes1 = self.extract_themes(card1.get('oracle_text', ''), card1.get('type_line', ''))
-        themes2 = self.extract_themes(card2.get('oracle_text', ''), card2.get('type_line', ''))
+    def _thematic_parts(self, name1: str, feats1: CardFeatures,
+                        name2: str, feats2: CardFeatures) -> Tuple[float, List[str]]:
+        """Raw thematic score and reasons, without building a SynergyScore."""
+        themes1 = feats1.themes
+        themes2 = feats2.themes
         
         score = 0.0
         reasons = []
@@ -261,39 +416,58 @@ class SynergyAnalyzer:
                 score += theme_score * 0.4
                 reasons.append(f"Shared theme: {theme} ({theme_score:.1f})")
         
-        return SynergyScore(
-            primary_card=name1,
-            synergy_card=name2,
-            score=min(score, 1.0),
-            reasons=reasons,
-            category='thematic'
-        )
+        return min(score, 1.0), reasons
     
-    def calculate_commander_synergy(self, commander: CommanderCard, card: Dict[str, Any]) -> SynergyScore:
-        """Calculate how well a card synergizes with a specific commander."""
-        card_name = card.get('name', '')
-        
-        # Combine all synergy types
-        commander_data = {
+    @staticmethod
+    def _commander_card_data(commander: CommanderCard) -> Dict[str, Any]:
+        """View a commander as a card dict for the card-to-card scorers."""
+        return {
             'name': commander.name,
             'oracle_text': commander.rules_text,
             'type_line': ' '.join(commander.types + commander.subtypes)
         }
+    
+    def calculate_commander_synergy(self, commander: CommanderCard, card: Dict[str, Any]) -> SynergyScore:
+        """Calculate how well a card synergizes with a specific commander."""
+        commander_feats = self._featurize(self._commander_card_data(commander))
+        return self._commander_synergy_from_feats(commander, commander_feats, card)
+    
+    def calculate_commander_synergy_batch(self, commander: CommanderCard,
+                                          cards: List[Dict[str, Any]]) -> List[SynergyScore]:
+        """
+        Calculate commander synergy for many cards at once.
+        
+        Same scores as calculate_commander_synergy per card, but the
+        commander is featurized once for the whole batch.
+        """
+        commander_feats = self._featurize(self._commander_card_data(commander))
+        return [self._commander_synergy_from_feats(commander, commander_feats, card) for card in cards]
+    
+    def _commander_synergy_from_feats(self, commander: CommanderCard, commander_feats: CardFeatures,
+                                      card: Dict[str, Any]) -> SynergyScore:
+        """Commander synergy of a card against an already-featurized commander."""
+        card_name = card.get('name', '')
+        
+        # Combine all synergy types; only the final SynergyScore is built
+        card_feats = self._featurize(card)
         
-        mechanical = self.calculate_mechanical_synergy(commander_data, card)
-        tribal = self.calculate_tribal_synergy(commander_data, card)
-        thematic = self.calculate_thematic_synergy(commander_data, card)
+        mechanical, mechanical_reasons = self._mechanical_parts(
+            commander.name, commander_feats, card_name, card_feats)
+        tribal, tribal_reasons = self._tribal_parts(
+            commander.name, commander_feats, card_name, card_feats)
+        thematic, thematic_reasons = self._thematic_parts(
+            commander.name, commander_feats, card_name, card_feats)
         
         # Weight the scores
-        total_score = (mechanical.score * 0.4 + tribal.score * 0.3 + thematic.score * 0.3)
+        total_score = (mechanical * 0.4 + tribal * 0.3 + thematic * 0.3)
         
         all_reasons = []
-        if mechanical.reasons:
-            all_reasons.extend([f"Mechanical: {r}" for r in mechanical.reasons])
-        if tribal.reasons:
-            all_reasons.extend([f"Tribal: {r}" for r in tribal.reasons])
-        if thematic.reasons:
-            all_reasons.extend([f"Thematic: {r}" for r in thematic.reasons])
+        if mechanical_reasons:
+            all_reasons.extend([f"Mechanical: {r}" for r in mechanical_reasons])
+        if tribal_reasons:
+            all_reasons.extend([f"Tribal: {r}" for r in tribal_reasons])
+        if thematic_reasons:
+            all_reasons.extend([f"Thematic: {r}" for r in thematic_reasons])
         
         return SynergyScore(
             primary_card=commander.name,
@@ -303,35 +477,109 @@ class SynergyAnalyzer:
             category='commander_synergy'
         )
     
+    @staticmethod
+    def _bits_to_matrix(bits: List[int], width: int) -> np.ndarray:
+        """
+        Unpack per-card bitmasks into an (N, width) 0/1 matrix.
+        
+        The matrix is float64 so products go through the BLAS gemm kernels,
+        which are vectorized and multi-threaded; integer matmul in NumPy is a
+        single-threaded loop. Counts stay exact well past any deck size.
+        """
+        n_bytes = (width + 7) // 8
+        packed = np.frombuffer(b''.join(b.to_bytes(n_bytes, 'little') for b in bits), dtype=np.uint8)
+        matrix = np.unpackbits(packed.reshape(len(bits), n_bytes), axis=1, bitorder='little')
+        return matrix[:, :width].astype(np.float64)
+    
+    def _theme_matrix(self, feats: List[CardFeatures]) -> np.ndarray:
+        """Per-card theme relevance as an (N, themes) matrix, in self.themes order."""
+        theme_mat = np.zeros((len(feats), len(self._theme_ids)), dtype=np.float64)
+        for i, f in enumerate(feats):
+            for theme, score in f.themes.items():
+                theme_mat[i, self._theme_ids[theme]] = score
+        return theme_mat
+    
+    def _pairwise_scores(self, feats: List[CardFeatures],
+                         theme_mat: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Score every card pair at once from 0/1 feature matrices.
+        
+        Returns an array of shape (3, N, N) holding the mechanical, tribal and
+        thematic scores, matching the corresponding _*_synergy_from_feats methods.
+        A precomputed theme matrix for the same cards may be passed in.
+        """
+        # Mechanics: shared counts via M @ M.T, complementary counts via M @ C @ M.T
+        mech_mat = self._bits_to_matrix([f.mechanic_bits for f in feats], len(self._mechanic_ids))
+        shared_mechs = mech_mat @ mech_mat.T
+        comp_mechs = mech_mat @ self._complement_matrix @ mech_mat.T
+        mechanical = np.minimum(shared_mechs * 0.2 + comp_mechs * 0.3, 1.0)
+        
+        # Tribes: shared tribes plus support for a tribe only the other card has
+        tribe_mat = self._bits_to_matrix([f.tribe_bits for f in feats], len(self._tribe_ids))
+        mention_mat = self._bits_to_matrix([f.mention_bits for f in feats], len(self._tribe_ids))
+        shared_tribes = tribe_mat @ tribe_mat.T
+        support = tribe_mat @ (mention_mat * (1 - tribe_mat)).T
+        tribal = np.minimum(shared_tribes * 0.4 + (support + support.T) * 0.6, 1.0)
+        
+        # Themes: mean relevance of each shared theme, weighted 0.4
+        if theme_mat is None:
+            theme_mat = self._theme_matrix(feats)
+        present = (theme_mat > 0).astype(np.float64)
+        overlap = theme_mat @ present.T
+        thematic = np.minimum((overlap + overlap.T) * 0.2, 1.0)
+        
+        return np.stack([mechanical, tribal, thematic])
+    
+    @staticmethod
+    def _top_candidates(scores: np.ndarray, k: int, threshold: float) -> np.ndarray:
+        """
+        Indices that may hold the k highest scores above threshold, in input order.
+        
+        The vectorized scores can differ from the reported SynergyScore
+        values in the last bits, so the cut is widened by _SCORE_TOLERANCE;
+        callers re-filter and rank on the reported scores.
+        """
+        candidates = np.flatnonzero(scores > threshold - _SCORE_TOLERANCE)
+        if len(candidates) > k:
+            kth_best = np.partition(scores[candidates], len(candidates) - k)[len(candidates) - k]
+            candidates = candidates[scores[candidates] >= kth_best - _SCORE_TOLERANCE]
+        return candidates
+    
+    @staticmethod
+    def _rank_synergies(synergies: List[SynergyScore], k: int, threshold: float) -> List[SynergyScore]:
+        """The k best synergies scoring above threshold, best first; ties keep their order."""
+        kept = [s for s in synergies if s.score > threshold]
+        kept.sort(key=lambda s: s.score, reverse=True)
+        return kept[:k]
+    
     def find_combo_potential(self, cards: List[Dict[str, Any]]) -> List[Tuple[str, str, List[str]]]:
         """Identify potential combos between cards."""
         combos = []
         
-        # Known combo patterns
-        combo_patterns = [
-            # Infinite mana combos
-            (['untap', 'mana'], ['tap', 'mana'], "Infinite mana potential"),
-            # Infinite creatures
-            (['create', 'token'], ['sacrifice', 'create'], "Infinite creature generation"),
-            # Infinite card draw
-            (['draw', 'card'], ['discard', 'draw'], "Infinite card draw engine"),
-            # Infinite damage
-            (['damage', 'deal'], ['untap', 'damage'], "Infinite damage combo"),
-            # Infinite turns
-            (['extra turn'], ['return', 'hand'], "Infinite turns"),
-        ]
+        # One substring scan per card: bit k is set when _COMBO_TOKENS[k] appears
+        token_bits = []
+        for card in cards:
+            text = (card.get('oracle_text', '') or '').lower()
+            token_bits.append(sum(1 << k for k, token in enumerate(_COMBO_TOKENS) if token in text))
+        
+        # Bit p of first/second is set when the card can fill that side of pattern p
+        first = [sum(1 << p for p, (mask, _, _) in enumerate(_COMBO_MASKS) if bits & mask)
+                 for bits in token_bits]
+        second = [sum(1 << p for p, (_, mask, _) in enumerate(_COMBO_MASKS) if bits & mask)
+                  for bits in token_bits]
         
         for i, card1 in enumerate(cards):
-            for j, card2 in enumerate(cards[i+1:], i+1):
-                text1 = card1.get('oracle_text', '').lower()
-                text2 = card2.get('oracle_text', '').lower()
-                
-                for pattern1, pattern2, description in combo_patterns:
-                    if (any(p in text1 for p in pattern1) and 
-                        any(p in text2 for p in pattern2)):
+            if not first[i]:
+                continue
+            for j in range(i + 1, len(cards)):
+                matched = first[i] & second[j]
+                if not matched:
+                    continue
+                for p, (_, _, description) in enumerate(_COMBO_MASKS):
+                    if matched >> p & 1:
                         combos.append((
                             card1.get('name', ''),
-                            card2.get('name', ''),
+                            cards[j].get('name', ''),
                             [description]
                         ))
         
@@ -339,52 +587,60 @@ class SynergyAnalyzer:
     
     def analyze_deck_synergies(self, commander: CommanderCard, cards: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Comprehensive analysis of all synergies in a deck."""
-        # Calculate commander synergies
-        commander_synergies = []
-        for card in cards:
-            synergy = self.calculate_commander_synergy(commander, card)
-            if synergy.score > 0.1:  # Only include meaningful synergies
-                commander_synergies.append(synergy)
-        
-        # Sort by score
-        commander_synergies.sort(key=lambda x: x.score, reverse=True)
-        
-        # Find card-to-card synergies
-        card_synergies = []
-        for i, card1 in enumerate(cards):
-            for j, card2 in enumerate(cards[i+1:], i+1):
-                mechanical = self.calculate_mechanical_synergy(card1, card2)
-                tribal = self.calculate_tribal_synergy(card1, card2)
-                thematic = self.calculate_thematic_synergy(card1, card2)
-                
-                # Take the best synergy type
-                best_synergy = max([mechanical, tribal, thematic], key=lambda x: x.score)
-                if best_synergy.score > 0.2:
-                    card_synergies.append(best_synergy)
-        
-        card_synergies.sort(key=lambda x: x.score, reverse=True)
+        # Score the commander (row 0) and every card pair in one pass;
+        # features are extracted once per card
+        names = [card.get('name', '') for card in cards]
+        feats = [self._featurize(card) for card in cards]
+        all_feats = [self._featurize(self._commander_card_data(commander))] + feats
+        theme_mat = self._theme_matrix(all_feats)
+        scores = self._pairwise_scores(all_feats, theme_mat)
+        
+        # Calculate commander synergies, weighted as in calculate_commander_synergy
+        commander_scores = scores[0, 0, 1:] * 0.4 + scores[1, 0, 1:] * 0.3 + scores[2, 0, 1:] * 0.3
+        candidates = self._top_candidates(commander_scores, 10, threshold=0.1)
+        commander_synergies = self._rank_synergies(
+            self.calculate_commander_synergy_batch(commander, [cards[k] for k in candidates]),
+            10, threshold=0.1)
+        
+        # Best synergy type per pair; only candidate pairs are turned into
+        # SynergyScore objects, then ranked on the scores they report
+        pair_scores = scores[:, 1:, 1:]
+        rows, cols = np.triu_indices(len(cards), k=1)
+        best_score = pair_scores.max(axis=0)[rows, cols]
+        scorers = (self._mechanical_synergy_from_feats,
+                   self._tribal_synergy_from_feats,
+                   self._thematic_synergy_from_feats)
+        
+        pair_synergies = []
+        for k in self._top_candidates(best_score, 15, threshold=0.2):
+            i, j = rows[k], cols[k]
+            # max keeps the first on ties: mechanical beats tribal beats thematic
+            pair_synergies.append(max((scorer(names[i], feats[i], names[j], feats[j]) for scorer in scorers),
+                                      key=lambda s: s.score))
+        card_synergies = self._rank_synergies(pair_synergies, 15, threshold=0.2)
         
         # Find combos
         combos = self.find_combo_potential(cards)
         
-        # Analyze themes
-        all_themes = defaultdict(float)
-        for card in cards:
-            card_themes = self.extract_themes(card.get('oracle_text', ''), card.get('type_line', ''))
-            for theme, score in card_themes.items():
-                all_themes[theme] += score
-        
-        # Normalize theme scores
-        if all_themes:
-            max_theme_score = max(all_themes.values())
-            all_themes = {theme: score/max_theme_score for theme, score in all_themes.items()}
+        # Analyze themes: column totals over the deck's rows of the theme matrix
+        theme_totals = theme_mat[1:].sum(axis=0)
+        dominant_themes = {}
+        present = np.flatnonzero(theme_totals)
+        if len(present):
+            # Normalize theme scores
+            theme_totals /= theme_totals.max()
+            # Best first; ties keep the order in which themes first appear in the deck
+            first_seen = (theme_mat[1:, present] > 0).argmax(axis=0)
+            order = np.lexsort((present, first_seen, -theme_totals[present]))[:5]
+            theme_names = list(self._theme_ids)
+            dominant_themes = {theme_names[present[k]]: float(theme_totals[present[k]]) for k in order}
         
         return {
-            'commander_synergies': commander_synergies[:10],  # Top 10
-            'card_synergies': card_synergies[:15],  # Top 15
+            'commander_synergies': commander_synergies,  # Top 10
+            'card_synergies': card_synergies,  # Top 15
             'combos': combos,
-            'dominant_themes': dict(sorted(all_themes.items(), key=lambda x: x[1], reverse=True)[:5]),
-            'synergy_score': sum(s.score for s in commander_synergies[:10]) / min(len(commander_synergies), 10) if commander_synergies else 0.0
+            'dominant_themes': dominant_themes,
+            'synergy_score': sum(s.score for s in commander_synergies) / len(commander_synergies) if commander_synergies else 0.0
         }
 
 
@@ -6,12 +6,36 @@ for protecting access to AI-powered features.
 """
 
 import os
+import hmac
+import threading
 import hashlib
 import secrets
 import datetime
 from typing import Optional, Dict, Any
+from pymongo import ReturnDocument, WriteConcern
 from pymongo.errors import DuplicateKeyError
-from core.data_engine.cosmos_driver import get_mongo_client, get_collection
+from core.data_engine.cosmos_driver import get_shared_mongo_client, get_collection
+
+# Monthly AI query limit for new users, read once at import
+DEFAULT_AI_QUERIES_LIMIT = int(os.environ.get('AI_QUERIES_LIMIT', '50'))
+
+# PBKDF2-SHA256 work factor for new hashes; stored hashes carry their own count
+PASSWORD_HASH_ALGORITHM = 'pbkdf2_sha256'
+PASSWORD_HASH_ITERATIONS = 600000
+# Hashes created before the algorithm$iterations$salt$hash format was introduced
+LEGACY_HASH_ITERATIONS = 100000
+
+# Fields read on each code path, so lookups don't ship the whole user document
+AUTH_PROJECTION = {'_id': 0, 'user_id': 1, 'username': 1, 'email': 1, 'password_hash': 1, 'is_active': 1}
+QUOTA_PROJECTION = {'_id': 0, 'ai_queries_count': 1, 'ai_queries_limit': 1, 'queries_reset_date': 1}
+STATS_PROJECTION = {**QUOTA_PROJECTION, 'username': 1, 'email': 1, 'created_at': 1, 'last_login': 1}
+
+# Unique indexes on the users collection: (field, index name)
+USER_INDEXES = [('username', 'username_1'), ('email', 'email_1'), ('user_id', 'user_id_1')]
+
+# Index creation runs once per process, not once per UserManager instance
+_indexes_created = False
+_indexes_lock = threading.Lock()
 
 
 class User:
@@ -27,12 +51,13 @@ class User:
         self.is_active = True
         self.last_login = None
         self.ai_queries_count = 0
-        self.ai_queries_limit = int(os.environ.get('AI_QUERIES_LIMIT', '50'))  # Monthly limit
+        self.ai_queries_limit = DEFAULT_AI_QUERIES_LIMIT  # Monthly limit
         self.queries_reset_date = self._get_next_reset_date()
         self.subscription_tier = 'free'  # free, premium, pro
         self.deck_count = 0
     
-    def _get_next_reset_date(self):
+    @staticmethod
+    def _get_next_reset_date():
         """Calculate next monthly reset date."""
         now = datetime.datetime.utcnow()
         if now.month == 12:
@@ -63,14 +88,14 @@ class User:
         user = cls(
             username=data['username'],
             email=data['email'],
-            password_hash=data['password_hash'],
+            password_hash=data.get('password_hash', ''),
             created_at=data.get('created_at'),
             user_id=data.get('user_id')
         )
         user.is_active = data.get('is_active', True)
         user.last_login = data.get('last_login')
         user.ai_queries_count = data.get('ai_queries_count', 0)
-        user.ai_queries_limit = data.get('ai_queries_limit', 50)
+        user.ai_queries_limit = data.get('ai_queries_limit', DEFAULT_AI_QUERIES_LIMIT)
         user.queries_reset_date = data.get('queries_reset_date', user._get_next_reset_date())
         user.subscription_tier = data.get('subscription_tier', 'free')
         user.deck_count = data.get('deck_count', 0)
@@ -81,41 +106,61 @@ class UserManager:
     """Handles user authentication and management operations."""
     
     def __init__(self):
-        self.client = get_mongo_client()
+        self.client = get_shared_mongo_client()
         self.collection = get_collection(self.client, 'users', 'mtgecorec_users')
         # Create unique indexes for username and email
         self._create_indexes()
     
     def _create_indexes(self):
-        """Create database indexes for efficient queries."""
-        try:
-            self.collection.create_index("username", unique=True)
-            self.collection.create_index("email", unique=True)
-            self.collection.create_index("user_id", unique=True)
-        except Exception as e:
-            print(f"Index creation note: {e}")  # May already exist
+        """Create database indexes for efficient queries (once per process)."""
+        global _indexes_created
+        if _indexes_created:
+            return
+        
+        with _indexes_lock:
+            if _indexes_created:
+                return
+            try:
+                # One listing round-trip; only missing indexes are created
+                existing = set(self.collection.index_information())
+                for field, name in USER_INDEXES:
+                    if name not in existing:
+                        self.collection.create_index(field, unique=True, name=name)
+            except Exception as e:
+                print(f"Index creation note: {e}")
+            _indexes_created = True
     
     def hash_password(self, password: str) -> str:
         """Hash a password with salt for secure storage."""
         # Generate a random salt
-        salt = secrets.token_hex(32)
+        salt = secrets.token_bytes(32)
         # Hash password with salt
-        password_hash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000)
-        # Return salt + hash for storage
-        return salt + password_hash.hex()
+        password_hash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, PASSWORD_HASH_ITERATIONS)
+        # Store algorithm, work factor, salt and hash together
+        return f"{PASSWORD_HASH_ALGORITHM}${PASSWORD_HASH_ITERATIONS}${salt.hex()}${password_hash.hex()}"
     
     def verify_password(self, password: str, stored_hash: str) -> bool:
         """Verify a password against its stored hash."""
         try:
-            # Extract salt (first 64 characters) and hash
-            salt = stored_hash[:64]
-            stored_password_hash = stored_hash[64:]
-            # Hash provided password with same salt
-            password_hash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000)
-            return password_hash.hex() == stored_password_hash
+            if stored_hash.startswith(PASSWORD_HASH_ALGORITHM + '$'):
+                _, iterations, salt_hex, hash_hex = stored_hash.split('$')
+                salt = bytes.fromhex(salt_hex)
+                iterations = int(iterations)
+            else:
+                # Legacy format: 64 hex chars of salt (used as text) followed by the hash
+                salt = stored_hash[:64].encode()
+                hash_hex = stored_hash[64:]
+                iterations = LEGACY_HASH_ITERATIONS
+            # Hash provided password with same salt and compare in constant time
+            password_hash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+            return hmac.compare_digest(password_hash, bytes.fromhex(hash_hex))
         except Exception:
             return False
     
+    def needs_rehash(self, stored_hash: str) -> bool:
+        """Check whether a stored hash predates the current hashing parameters."""
+        return not stored_hash.startswith(f"{PASSWORD_HASH_ALGORITHM}${PASSWORD_HASH_ITERATIONS}$")
+    
     def register_user(self, username: str, email: str, password: str) -> Dict[str, Any]:
         """Register a new user."""
         try:
@@ -146,9 +191,12 @@ class UserManager:
             }
             
         except DuplicateKeyError as e:
-            if 'username' in str(e):
+            # The server reports the violated unique index in the error details
+            details = e.details or {}
+            key_pattern = details.get('keyPattern') or details.get('keyValue') or {}
+            if 'username' in key_pattern:
                 return {'success': False, 'error': 'Username already exists'}
-            elif 'email' in str(e):
+            elif 'email' in key_pattern:
                 return {'success': False, 'error': 'Email already registered'}
             else:
                 return {'success': False, 'error': 'User already exists'}
@@ -159,13 +207,19 @@ class UserManager:
     def authenticate_user(self, username: str, password: str) -> Dict[str, Any]:
         """Authenticate a user login."""
         try:
-            # Find user by username or email
-            user_doc = self.collection.find_one({
-                '$or': [
-                    {'username': username},
-                    {'email': username.lower()}
-                ]
-            })
+            # Find user by username or email, recording the attempt in the same round-trip
+            now = datetime.datetime.utcnow()
+            user_doc = self.collection.find_one_and_update(
+                {
+                    '$or': [
+                        {'username': username},
+                        {'email': username.lower()}
+                    ]
+                },
+                {'$set': {'last_login_attempt': now}},
+                projection=AUTH_PROJECTION,
+                return_document=ReturnDocument.BEFORE
+            )
             
             if not user_doc:
                 return {'success': False, 'error': 'Invalid username or password'}
@@ -178,15 +232,23 @@ class UserManager:
             if not self.verify_password(password, user.password_hash):
                 return {'success': False, 'error': 'Invalid username or password'}
             
-            # Update last login
-            self.collection.update_one(
+            # Update last login, upgrading an outdated password hash on the way.
+            # A plain timestamp update is sent unacknowledged so login doesn't wait
+            # on a second round-trip; a password hash upgrade is always acknowledged.
+            updates = {'last_login': now}
+            collection = self.collection.with_options(write_concern=WriteConcern(w=0))
+            if self.needs_rehash(user.password_hash):
+                user.password_hash = self.hash_password(password)
+                updates['password_hash'] = user.password_hash
+                collection = self.collection
+            collection.update_one(
                 {'user_id': user.user_id},
-                {'$set': {'last_login': datetime.datetime.utcnow()}}
+                {'$set': updates}
             )
             
             return {
                 'success': True,
-                'user': user.to_dict(),
+                'user': {key: value for key, value in user_doc.items() if key != 'password_hash'},
                 'message': 'Login successful'
             }
             
@@ -197,7 +259,7 @@ class UserManager:
     def get_user_by_id(self, user_id: str) -> Optional[User]:
         """Get user by ID."""
         try:
-            user_doc = self.collection.find_one({'user_id': user_id})
+            user_doc = self.collection.find_one({'user_id': user_id}, {'_id': 0, 'password_hash': 0})
             if user_doc:
                 return User.from_dict(user_doc)
             return None
@@ -214,38 +276,78 @@ class UserManager:
             print(f"Error fetching user: {e}")
             return None
     
-    def can_make_ai_query(self, user_id: str) -> Dict[str, Any]:
-        """Check if user can make an AI query."""
-        user = self.get_user_by_id(user_id)
-        if not user:
-            return {'allowed': False, 'reason': 'User not found'}
-        
-        # Reset counter if it's a new month
-        now = datetime.datetime.utcnow()
-        if now >= user.queries_reset_date:
-            self.collection.update_one(
-                {'user_id': user_id},
-                {
-                    '$set': {
-                        'ai_queries_count': 0,
-                        'queries_reset_date': user._get_next_reset_date()
-                    }
-                }
-            )
-            user.ai_queries_count = 0
-        
-        if user.ai_queries_count >= user.ai_queries_limit:
+    def _reset_counter_stage(self, now: datetime.datetime) -> Dict[str, Any]:
+        """Pipeline stage that zeroes the AI query counter once the reset date has passed."""
+        reset_due = {'$lte': [{'$ifNull': ['$queries_reset_date', now]}, now]}
+        next_reset = User._get_next_reset_date()
+        return {
+            '$set': {
+                'ai_queries_count': {'$cond': [reset_due, 0, {'$ifNull': ['$ai_queries_count', 0]}]},
+                'queries_reset_date': {'$cond': [reset_due, next_reset, '$queries_reset_date']}
+            }
+        }
+    
+    def _query_check_result(self, user_doc: Dict[str, Any], used: int) -> Dict[str, Any]:
+        """Build the allowed/denied response for a user's AI query quota."""
+        limit = user_doc.get('ai_queries_limit', DEFAULT_AI_QUERIES_LIMIT)
+        if used >= limit:
             return {
                 'allowed': False,
-                'reason': f'Monthly AI query limit ({user.ai_queries_limit}) reached',
-                'reset_date': user.queries_reset_date
+                'reason': f'Monthly AI query limit ({limit}) reached',
+                'reset_date': user_doc.get('queries_reset_date')
             }
         
         return {
             'allowed': True,
-            'remaining_queries': user.ai_queries_limit - user.ai_queries_count
+            'remaining_queries': limit - used
         }
     
+    def can_make_ai_query(self, user_id: str) -> Dict[str, Any]:
+        """Check if user can make an AI query."""
+        # Reset counter if it's a new month, and read it back, in one round-trip
+        user_doc = self.collection.find_one_and_update(
+            {'user_id': user_id},
+            [self._reset_counter_stage(datetime.datetime.utcnow())],
+            projection=QUOTA_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if not user_doc:
+            return {'allowed': False, 'reason': 'User not found'}
+        
+        return self._query_check_result(user_doc, user_doc.get('ai_queries_count', 0))
+    
+    def reserve_ai_query(self, user_id: str) -> Dict[str, Any]:
+        """
+        Atomically reset (if due) and increment the user's AI query count.
+        
+        The increment is undone when it pushes the user over their limit, so
+        concurrent requests can never exceed the monthly quota.
+        """
+        user_doc = self.collection.find_one_and_update(
+            {'user_id': user_id},
+            [
+                self._reset_counter_stage(datetime.datetime.utcnow()),
+                {'$set': {'ai_queries_count': {'$add': ['$ai_queries_count', 1]}}}
+            ],
+            projection=QUOTA_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if not user_doc:
+            return {'allowed': False, 'reason': 'User not found'}
+        
+        # Count before this request's increment
+        used = user_doc['ai_queries_count'] - 1
+        result = self._query_check_result(user_doc, used)
+        if not result['allowed']:
+            self.release_ai_query(user_id)
+        else:
+            result['remaining_queries'] -= 1
+        return result
+    
+    def release_ai_query(self, user_id: str) -> None:
+        """Give back a query taken by reserve_ai_query."""
+        self.collection.update_one({'user_id': user_id}, {'$inc': {'ai_queries_count': -1}})
+    
     def increment_ai_query_count(self, user_id: str) -> bool:
         """Increment user's AI query count."""
         try:
@@ -260,21 +362,28 @@ class UserManager:
     
     def get_user_stats(self, user_id: str) -> Dict[str, Any]:
         """Get user statistics."""
-        user = self.get_user_by_id(user_id)
-        if not user:
+        # Apply any pending monthly reset and read the stats in one round-trip
+        user_doc = self.collection.find_one_and_update(
+            {'user_id': user_id},
+            [self._reset_counter_stage(datetime.datetime.utcnow())],
+            projection=STATS_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if not user_doc:
             return {'error': 'User not found'}
         
-        query_check = self.can_make_ai_query(user_id)
+        used = user_doc.get('ai_queries_count', 0)
+        query_check = self._query_check_result(user_doc, used)
         
         return {
-            'username': user.username,
-            'email': user.email,
-            'member_since': user.created_at,
-            'last_login': user.last_login,
-            'ai_queries_used': user.ai_queries_count,
-            'ai_queries_limit': user.ai_queries_limit,
+            'username': user_doc.get('username'),
+            'email': user_doc.get('email'),
+            'member_since': user_doc.get('created_at'),
+            'last_login': user_doc.get('last_login'),
+            'ai_queries_used': used,
+            'ai_queries_limit': user_doc.get('ai_queries_limit', DEFAULT_AI_QUERIES_LIMIT),
             'ai_queries_remaining': query_check.get('remaining_queries', 0),
-            'queries_reset_date': user.queries_reset_date
+            'queries_reset_date': user_doc.get('queries_reset_date')
         }
 
 
@@ -24,16 +24,28 @@
 # COMMAND ----------
 
 import requests
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+
+# orjson parses the Collection API responses several times faster when the
+# cluster has it; the stdlib parser is the fallback
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 from pymongo import MongoClient, UpdateOne
-from pyspark.sql.functions import col, explode, lit, current_timestamp
+from pyspark.sql.functions import broadcast, col, explode, lit, current_timestamp
+from pyspark.sql.types import LongType, MapType, StringType, StructField, StructType
 
 # Configuration
 SCRYFALL_BULK_API = "https://api.scryfall.com/bulk-data"
 SCRYFALL_COLLECTION_API = "https://api.scryfall.com/cards/collection"
 BATCH_SIZE = 75  # Scryfall allows 75 identifiers per request
 RATE_LIMIT_DELAY = 0.1  # 100ms between requests (Scryfall rate limit)
+MAX_WORKERS = 8  # Concurrent API requests (still paced by RATE_LIMIT_DELAY)
 MONGO_RETENTION_DAYS = 7  # Keep only 7 days in MongoDB
 
 # Get MongoDB connection from secrets
@@ -45,6 +57,10 @@ pricing_collection = db["card_pricing_daily"]
 print(f"✅ Connected to MongoDB database: {db.name}")
 print(f"✅ Target collection: {pricing_collection.name}")
 
+# Shared HTTP session (keep-alive, pooled connections across batches)
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
 # COMMAND ----------
 
 # MAGIC %md
@@ -54,18 +70,11 @@ print(f"✅ Target collection: {pricing_collection.name}")
 
 # Get all cards that need pricing updates
 # (Only cards that are legal in some format and have pricing available)
-cards_df = (spark.read
-  .format("mongo")
-  .option("uri", mongo_uri)
-  .option("database", "mtgecorec")
-  .option("collection", "cards")
-  .load()
-  .select("id", "name")
-  .filter(col("id").isNotNull())
-)
-
-total_cards = cards_df.count()
-card_ids = [row.id for row in cards_df.collect()]
+# Read the ids straight from MongoDB; a Spark read + collect() would only
+# round-trip them through the JVM
+cards_cursor = db["cards"].find({"id": {"$ne": None}}, {"id": 1, "_id": 0}).batch_size(10000)
+card_ids = [doc["id"] for doc in cards_cursor]
+total_cards = len(card_ids)
 
 print(f"✅ Found {total_cards:,} cards to update pricing for")
 print(f"📦 Will process in batches of {BATCH_SIZE}")
@@ -78,6 +87,22 @@ print(f"⏱️ Estimated time: {(total_cards / BATCH_SIZE * RATE_LIMIT_DELAY / 6
 
 # COMMAND ----------
 
+_rate_limit_lock = threading.Lock()
+_next_request_time = 0.0
+
+def wait_for_rate_limit():
+    """
+    Block until this thread may send a request, keeping requests across all
+    workers at least RATE_LIMIT_DELAY apart
+    """
+    global _next_request_time
+    with _rate_limit_lock:
+        now = time.monotonic()
+        wait = _next_request_time - now
+        _next_request_time = max(now, _next_request_time) + RATE_LIMIT_DELAY
+    if wait > 0:
+        time.sleep(wait)
+
 def fetch_pricing_batch(card_identifiers):
     """
     Fetch pricing for a batch of cards from Scryfall Collection API
@@ -94,9 +119,10 @@ def fetch_pricing_batch(card_identifiers):
     }
     
     try:
-        response = requests.post(url, json=payload, timeout=30)
+        wait_for_rate_limit()
+        response = session.post(url, json=payload, timeout=30)
         response.raise_for_status()
-        data = response.json()
+        data = json_loads(response.content)
         
         if "data" in data:
             return data["data"]
@@ -107,89 +133,99 @@ def fetch_pricing_batch(card_identifiers):
     except requests.exceptions.RequestException as e:
         print(f"❌ API request failed: {e}")
         return []
+    except ValueError as e:
+        print(f"❌ Invalid JSON response: {e}")
+        return []
 
-def extract_pricing_records(card, collection_date):
+def pricing_fields(card):
     """
-    Extract pricing records from Scryfall card object
-    
-    Converts from:
-      {prices: {usd: "2.50", usd_foil: "5.00", ...}}
-    
-    To (unpivoted):
-      [
-        {scryfall_id: "abc", date: "2026-02-03", price_type: "usd", price_value: 2.50},
-        {scryfall_id: "abc", date: "2026-02-03", price_type: "usd_foil", price_value: 5.00},
-        ...
-      ]
+    Keep only the fields of a Scryfall card object that pricing needs
+    (unpivoting into per-price records happens in Spark below)
     """
-    records = []
-    prices = card.get("prices", {})
-    
-    # Map price types to currency and finish
-    price_mappings = {
-        "usd": {"currency": "usd", "finish": "nonfoil"},
-        "usd_foil": {"currency": "usd", "finish": "foil"},
-        "usd_etched": {"currency": "usd", "finish": "etched"},
-        "eur": {"currency": "eur", "finish": "nonfoil"},
-        "eur_foil": {"currency": "eur", "finish": "foil"},
-        "tix": {"currency": "tix", "finish": "nonfoil"},
+    return {
+        "id": card["id"],
+        "name": card["name"],
+        "prices": card.get("prices") or {},
+        "tcgplayer_id": card.get("tcgplayer_id"),
+        "cardmarket_id": card.get("cardmarket_id"),
     }
-    
-    for price_type, price_value in prices.items():
-        if price_value is not None and price_type in price_mappings:
-            try:
-                price_float = float(price_value)
-                if price_float > 0:
-                    mapping = price_mappings[price_type]
-                    records.append({
-                        "scryfall_id": card["id"],
-                        "card_name": card["name"],
-                        "date": collection_date,
-                        "price_type": price_type,
-                        "price_value": price_float,
-                        "currency": mapping["currency"],
-                        "finish": mapping["finish"],
-                        "tcgplayer_id": card.get("tcgplayer_id"),
-                        "cardmarket_id": card.get("cardmarket_id"),
-                        "collected_at": datetime.utcnow().isoformat(),
-                        "source": "scryfall_api"
-                    })
-            except (ValueError, TypeError):
-                continue
-    
-    return records
+
+# Price types to currency and finish
+PRICE_MAPPINGS = [
+    ("usd", "usd", "nonfoil"),
+    ("usd_foil", "usd", "foil"),
+    ("usd_etched", "usd", "etched"),
+    ("eur", "eur", "nonfoil"),
+    ("eur_foil", "eur", "foil"),
+    ("tix", "tix", "nonfoil"),
+]
+
+CARD_PRICES_SCHEMA = StructType([
+    StructField("id", StringType(), False),
+    StructField("name", StringType(), True),
+    StructField("prices", MapType(StringType(), StringType(), True), True),
+    StructField("tcgplayer_id", LongType(), True),
+    StructField("cardmarket_id", LongType(), True),
+])
 
 # COMMAND ----------
 
-# Collect all pricing records
-all_pricing_records = []
+# Collect the priced cards
+all_cards = []
 collection_date = datetime.utcnow().strftime("%Y-%m-%d")
 total_batches = (len(card_ids) + BATCH_SIZE - 1) // BATCH_SIZE
 
 print(f"🚀 Starting pricing collection for {collection_date}")
 print(f"📊 Processing {total_batches:,} batches...")
 
-for i in range(0, len(card_ids), BATCH_SIZE):
-    batch_num = i // BATCH_SIZE + 1
-    batch_ids = card_ids[i:i + BATCH_SIZE]
-    
-    # Fetch pricing for this batch
-    cards_data = fetch_pricing_batch(batch_ids)
-    
-    # Extract pricing records
-    for card in cards_data:
-        records = extract_pricing_records(card, collection_date)
-        all_pricing_records.extend(records)
-    
-    # Progress update
-    if batch_num % 100 == 0 or batch_num == total_batches:
-        print(f"  ✓ Processed {batch_num:,} / {total_batches:,} batches ({len(all_pricing_records):,} records)")
-    
-    # Rate limiting
-    if i + BATCH_SIZE < len(card_ids):
-        time.sleep(RATE_LIMIT_DELAY)
+batches = [card_ids[i:i + BATCH_SIZE] for i in range(0, len(card_ids), BATCH_SIZE)]
+
+# Fetch batches concurrently; wait_for_rate_limit paces the requests and
+# map() hands results back in batch order
+with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+    for batch_num, cards_data in enumerate(executor.map(fetch_pricing_batch, batches), start=1):
+        all_cards.extend(pricing_fields(card) for card in cards_data)
+        
+        # Progress update
+        if batch_num % 100 == 0 or batch_num == total_batches:
+            print(f"  ✓ Processed {batch_num:,} / {total_batches:,} batches ({len(all_cards):,} cards)")
+
+print(f"✅ Collection complete: {len(all_cards):,} cards")
+
+# COMMAND ----------
+
+# Unpivot prices into one record per card and price type:
+#   {prices: {usd: "2.50", usd_foil: "5.00", ...}}
+# becomes
+#   {scryfall_id: "abc", date: "2026-02-03", price_type: "usd", price_value: 2.50}, ...
+# Null, unparseable and non-positive prices are dropped
+collected_at = datetime.utcnow().isoformat()
+price_mappings_df = spark.createDataFrame(PRICE_MAPPINGS, ["price_type", "currency", "finish"])
+
+pricing_df = (spark.createDataFrame(all_cards, schema=CARD_PRICES_SCHEMA)
+  .select("id", "name", "tcgplayer_id", "cardmarket_id",
+          explode("prices").alias("price_type", "price_string"))
+  .join(broadcast(price_mappings_df), "price_type")
+  .withColumn("price_value", col("price_string").cast("double"))
+  .filter(col("price_value") > 0)
+  .select(
+      col("id").alias("scryfall_id"),
+      col("name").alias("card_name"),
+      lit(collection_date).alias("date"),
+      "price_type",
+      "price_value",
+      "currency",
+      "finish",
+      "tcgplayer_id",
+      "cardmarket_id",
+      lit(collected_at).alias("collected_at"),
+      lit("scryfall_api").alias("source"),
+  )
+  .cache()
+)
 
-print(f"✅ Collection complete: {len(all_pricing_records):,} pricing records")
+total_records = pricing_df.count()
+print(f"✅ Extracted {total_records:,} pricing records")
 
 # COMMAND ----------
 
@@ -198,19 +234,25 @@ print(f"✅ Collection complete: {len(all_pricing_records):,} pricing records")
 
 # COMMAND ----------
 
-if len(all_pricing_records) > 0:
-    # Bulk write to MongoDB (much faster than individual inserts)
-    print(f"💾 Writing {len(all_pricing_records):,} records to MongoDB...")
+if total_records > 0:
+    # Append through the Mongo Spark connector (written in parallel by the executors)
+    print(f"💾 Writing {total_records:,} records to MongoDB...")
     
     start_time = time.time()
     
-    # Use bulk insert (faster than upserts for daily batch)
-    result = pricing_collection.insert_many(all_pricing_records, ordered=False)
+    (pricing_df.write
+      .format("mongo")
+      .mode("append")
+      .option("uri", mongo_uri)
+      .option("database", "mtgecorec")
+      .option("collection", "card_pricing_daily")
+      .save()
+    )
     
     elapsed = time.time() - start_time
     
-    print(f"✅ Inserted {len(result.inserted_ids):,} records in {elapsed:.1f} seconds")
-    print(f"📈 Throughput: {len(result.inserted_ids) / elapsed:.0f} records/second")
+    print(f"✅ Inserted {total_records:,} records in {elapsed:.1f} seconds")
+    print(f"📈 Throughput: {total_records / elapsed:.0f} records/second")
 else:
     print("⚠️ No pricing records to insert")
 
@@ -317,6 +359,8 @@ print("=" * 60)
 # COMMAND ----------
 
 # Cleanup
+pricing_df.unpersist()
+session.close()
 mongo_client.close()
 print("\n✅ Pipeline complete!")
 print(f"⏭️ Next step: Run dbt transformation to load into Delta Lake")
@@ -0,0 +1,51 @@
+"""
+Unit tests for CardDatabaseCache background refresh of expired cards
+"""
+import datetime
+import pytest
+from core.data_engine import cosmos_driver
+from core.data_engine.cosmos_driver import CardDatabaseCache, CARD_CACHE_RETRY_DELAY
+
+
+class InlineThread:
+    """Runs the refresh on start() so the test sees its result immediately."""
+
+    def __init__(self, target, args=(), daemon=None):
+        self.target = target
+        self.args = args
+
+    def start(self):
+        self.target(*self.args)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    # A private instance, not the process-wide singleton
+    cache = object.__new__(CardDatabaseCache)
+    CardDatabaseCache.__init__(cache, ttl_minutes=60)
+    cache._cache = [{'name': 'Old Card'}]
+    cache._last_refresh = datetime.datetime.utcnow() - datetime.timedelta(hours=2)
+    monkeypatch.setattr(cosmos_driver.threading, 'Thread', InlineThread)
+    return cache
+
+
+def test_failed_refresh_backs_off(monkeypatch, cache):
+    """After a failed reload the expired cards are served until the retry delay passes"""
+    loads = []
+
+    def failing_load():
+        loads.append(1)
+        raise ConnectionError('server selection timeout')
+
+    monkeypatch.setattr(cache, '_load_cards', failing_load)
+
+    assert cache.get_all_cards() == [{'name': 'Old Card'}]
+    assert cache.get_all_cards() == [{'name': 'Old Card'}]
+    assert len(loads) == 1
+
+    # Once the retry delay has passed, the next access reloads again
+    cache._last_refresh -= CARD_CACHE_RETRY_DELAY
+    monkeypatch.setattr(cache, '_load_cards', lambda: [{'name': 'New Card'}])
+
+    assert cache.get_all_cards() == [{'name': 'Old Card'}]
+    assert cache.get_all_cards() == [{'name': 'New Card'}]
@@ -2,7 +2,8 @@
 Integration test for multiprocessing worker with CommanderCard serialization
 """
 from core.data_engine.commander_model import CommanderCard, ColorIdentity
-from core.data_engine.commander_recommender import _score_batch_worker
+from core.data_engine import commander_recommender
+from core.data_engine.commander_recommender import _score_batch_worker, CommanderRecommendationEngine
 
 
 def test_worker_function_with_serialization():
@@ -46,7 +47,7 @@ def test_worker_function_with_serialization():
         ])
     ]
     
-    current_deck = []
+    deck_categories = {'lands': 1, 'ramp': 1}
     budget_limit = None
     
     print(f"✓ Test data prepared: {len(card_items)} card(s)")
@@ -56,7 +57,7 @@ def test_worker_function_with_serialization():
         results = _score_batch_worker(
             card_items,
             commander_dict,  # Pass serialized commander
-            current_deck,
+            deck_categories,
             budget_limit
         )
         
@@ -76,6 +77,28 @@ def test_worker_function_with_serialization():
         raise
 
 
+def test_categorize_deck_resolves_names_through_card_index(monkeypatch):
+    """Deck card names are looked up in the card database before categorizing"""
+    all_cards = [
+        {'name': 'Forest', 'type_line': 'Basic Land — Forest', 'oracle_text': '({T}: Add {G}.)', 'cmc': 0},
+        {'name': 'Swamp', 'type_line': 'Basic Land — Swamp', 'oracle_text': '({T}: Add {B}.)', 'cmc': 0},
+        {'name': 'Beast Within', 'type_line': 'Instant',
+         'oracle_text': 'Destroy target permanent. Its controller creates a 3/3 green Beast creature token.', 'cmc': 3},
+        {'name': "Night's Whisper", 'type_line': 'Sorcery',
+         'oracle_text': 'You draw two cards and you lose 2 life.', 'cmc': 2},
+        {'name': 'Phyrexian Arena', 'type_line': 'Enchantment',
+         'oracle_text': 'At the beginning of your upkeep, you draw a card and you lose 1 life.', 'cmc': 3}
+    ]
+    monkeypatch.setattr(commander_recommender.cosmos_driver, 'get_all_cards', lambda: all_cards)
+    engine = CommanderRecommendationEngine(use_ai=False)
+    
+    # Names match case-insensitively; names not in the database are skipped
+    deck_categories = engine._categorize_deck(['Forest', 'swamp', 'BEAST WITHIN', 'Phyrexian Arena', 'Unknown Card'])
+    
+    assert deck_categories == {'lands': 2, 'removal': 1, 'draw': 1}
+    assert engine._categorize_deck([]) == {}
+
+
 if __name__ == "__main__":
     print("\n" + "="*60)
     print("Multiprocessing Worker Integration Test")
@@ -0,0 +1,169 @@
+"""
+Unit tests for SynergyAnalyzer card-to-card and deck synergy scoring
+"""
+import pytest
+from core.data_engine.synergy_analyzer import SynergyAnalyzer
+from core.data_engine.commander_model import CommanderCard
+
+
+@pytest.fixture
+def analyzer():
+    return SynergyAnalyzer()
+
+
+@pytest.fixture
+def cards():
+    return [
+        {
+            'name': 'Doomed Dissenter',
+            'oracle_text': 'When Doomed Dissenter dies, create a 2/2 black Zombie creature token.',
+            'type_line': 'Creature — Human'
+        },
+        {
+            'name': 'Viscera Seer',
+            'oracle_text': 'Sacrifice a creature: Scry 1.',
+            'type_line': 'Creature — Vampire Wizard'
+        },
+        {
+            'name': 'Blood Artist',
+            'oracle_text': 'Whenever Blood Artist or another creature dies, target player loses 1 life and you gain 1 life.',
+            'type_line': 'Creature — Vampire'
+        },
+        {
+            'name': 'Gravecrawler',
+            'oracle_text': "Gravecrawler can't block. You may cast Gravecrawler from your graveyard as long as you control a Zombie.",
+            'type_line': 'Creature — Zombie'
+        },
+        {
+            'name': 'Doubling Season',
+            'oracle_text': 'If an effect would create one or more tokens under your control, it creates twice that many of those tokens instead.',
+            'type_line': 'Enchantment'
+        }
+    ]
+
+
+@pytest.fixture
+def commander():
+    return CommanderCard.from_card_data({
+        'name': 'Wilhelt, the Rotcleaver',
+        'mana_cost': '{2}{U}{B}',
+        'type_line': 'Legendary Creature — Zombie Warrior',
+        'oracle_text': 'Whenever another Zombie you control dies, if it didn\'t have decayed, create a 2/2 black Zombie creature token with decayed. At the beginning of your end step, you may sacrifice a Zombie. If you do, draw a card.'
+    })
+
+
+def test_featurize_is_memoized(analyzer, cards):
+    """Features are extracted once per distinct card text"""
+    first = analyzer._featurize(cards[2])
+    second = analyzer._featurize(dict(cards[2]))
+
+    assert first is second
+    assert 'gain_life' in first.mechanics
+    assert 'vampire' in first.tribes
+
+
+def test_mechanical_synergy_complementary(analyzer, cards):
+    """Sacrifice outlets and death triggers are scored as complementary"""
+    synergy = analyzer.calculate_mechanical_synergy(cards[0], cards[1])
+
+    assert synergy.category == 'mechanical'
+    assert 'Complementary: dies + sacrifice' in synergy.reasons
+    assert synergy.score == pytest.approx(0.3)
+
+
+def test_tribal_synergy_shared_tribe(analyzer, cards):
+    """Cards sharing a creature type get a tribal bonus"""
+    synergy = analyzer.calculate_tribal_synergy(cards[1], cards[2])
+
+    assert synergy.score == pytest.approx(0.4)
+    assert synergy.reasons == ['Shared tribes: vampire']
+
+
+def test_analyze_deck_synergies(analyzer, commander, cards):
+    """Deck analysis returns ranked commander and card synergies"""
+    analysis = analyzer.analyze_deck_synergies(commander, cards)
+
+    commander_scores = [s.score for s in analysis['commander_synergies']]
+    card_scores = [s.score for s in analysis['card_synergies']]
+
+    assert commander_scores == sorted(commander_scores, reverse=True)
+    assert card_scores == sorted(card_scores, reverse=True)
+    assert all(s.score > 0.2 for s in analysis['card_synergies'])
+    assert analysis['dominant_themes']
+    assert max(analysis['dominant_themes'].values()) == pytest.approx(1.0)
+
+
+def test_analyze_empty_deck(analyzer, commander):
+    """An empty deck produces an empty analysis"""
+    analysis = analyzer.analyze_deck_synergies(commander, [])
+
+    assert analysis['commander_synergies'] == []
+    assert analysis['card_synergies'] == []
+    assert analysis['combos'] == []
+    assert analysis['synergy_score'] == 0.0
+
+
+def test_commander_synergy_batch_matches_single(analyzer, commander, cards):
+    """Batch commander scoring gives the same results as scoring card by card"""
+    batch = analyzer.calculate_commander_synergy_batch(commander, cards)
+    single = [analyzer.calculate_commander_synergy(commander, card) for card in cards]
+
+    assert [(s.synergy_card, s.score, s.reasons) for s in batch] == \
+        [(s.synergy_card, s.score, s.reasons) for s in single]
+    assert analyzer.calculate_commander_synergy_batch(commander, []) == []
+
+
+def test_analyze_deck_ranks_on_reported_scores(analyzer, commander):
+    """Near-tied pairs are ordered, and thresholds applied, on the scores returned"""
+    deck = [
+        {
+            'name': 'Card A',
+            'oracle_text': 'Each opponent loses life Copy target instant or sorcery spell.',
+            'type_line': 'Creature — Elf Druid'
+        },
+        {
+            'name': 'Card B',
+            'oracle_text': 'Each opponent loses life protection from red Elves you control get +1/+1.',
+            'type_line': 'Sorcery'
+        },
+        {
+            'name': 'Card C',
+            'oracle_text': "Return target permanent to its owner's hand. Whenever you cast a spell, storm flying",
+            'type_line': 'Instant'
+        }
+    ]
+    analysis = analyzer.analyze_deck_synergies(commander, deck)
+
+    # Card A pairs with B and C at scores a few ulps apart
+    pairs = [(s.primary_card, s.synergy_card) for s in analysis['card_synergies']]
+    card_scores = [s.score for s in analysis['card_synergies']]
+    assert pairs == [('Card A', 'Card C'), ('Card A', 'Card B'), ('Card B', 'Card C')]
+    assert card_scores == sorted(card_scores, reverse=True)
+
+
+def test_analyze_deck_commander_threshold_is_strict(analyzer):
+    """A card whose commander synergy is exactly 0.1 is left out"""
+    commander = CommanderCard.from_card_data({
+        'name': 'Test Commander',
+        'mana_cost': '{G}{B}',
+        'type_line': 'Creature — Zombie',
+        'oracle_text': 'Copy target instant or sorcery spell. first strike Equipment you control'
+    })
+    deck = [
+        {
+            'name': 'Borderline',
+            'oracle_text': "Search your library for a basic land card can't block Counter target spell.",
+            'type_line': 'Artifact Creature — Golem'
+        },
+        {
+            'name': 'Strong',
+            'oracle_text': 'Counter target spell. Take an extra turn after this one. first strike',
+            'type_line': 'Creature — Zombie'
+        }
+    ]
+    assert analyzer.calculate_commander_synergy(commander, deck[0]).score == 0.1
+
+    analysis = analyzer.analyze_deck_synergies(commander, deck)
+
+    assert [s.synergy_card for s in analysis['commander_synergies']] == ['Strong']
+    assert analysis['synergy_score'] == analysis['commander_synergies'][0].score
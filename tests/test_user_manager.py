@@ -0,0 +1,190 @@
+"""
+Unit tests for UserManager AI query quota reservation, against an in-memory users collection
+"""
+import datetime
+import pytest
+from flask import Flask, request, session
+from core.data_engine import cosmos_driver
+from core.data_engine.user_manager import UserManager
+
+
+def _evaluate(expr, doc):
+    """Evaluate the aggregation expressions used in UserManager's update pipelines."""
+    if isinstance(expr, str) and expr.startswith('$'):
+        return doc.get(expr[1:])
+    if not isinstance(expr, dict):
+        return expr
+
+    (op, args), = expr.items()
+    values = [_evaluate(arg, doc) for arg in args]
+    if op == '$ifNull':
+        return next((value for value in values if value is not None), None)
+    if op == '$lte':
+        return values[0] <= values[1]
+    if op == '$cond':
+        return values[1] if values[0] else values[2]
+    if op == '$add':
+        # Like MongoDB, adding a missing field gives null
+        return None if None in values else sum(values)
+    raise NotImplementedError(op)
+
+
+class FakeUsersCollection:
+    """Users collection supporting the pipeline updates UserManager issues."""
+
+    def __init__(self, *docs):
+        self.docs = {doc['user_id']: dict(doc) for doc in docs}
+
+    def index_information(self):
+        return {}
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def find_one_and_update(self, query, pipeline, projection=None, return_document=None):
+        doc = self.docs.get(query['user_id'])
+        if doc is None:
+            return None
+
+        for stage in pipeline:
+            (op, fields), = stage.items()
+            assert op == '$set'
+            # Each stage sees the document as the previous stage left it
+            doc = {**doc, **{field: _evaluate(expr, doc) for field, expr in fields.items()}}
+        self.docs[query['user_id']] = doc
+
+        if projection is None:
+            return dict(doc)
+        return {field: doc[field] for field, include in projection.items() if include and field in doc}
+
+    def update_one(self, query, update):
+        doc = self.docs[query['user_id']]
+        for field, amount in update['$inc'].items():
+            doc[field] = doc.get(field, 0) + amount
+
+
+def _next_month():
+    return datetime.datetime.utcnow() + datetime.timedelta(days=31)
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    users = FakeUsersCollection(
+        {'user_id': 'at-limit', 'ai_queries_count': 5, 'ai_queries_limit': 5, 'queries_reset_date': _next_month()},
+        {'user_id': 'new', 'ai_queries_limit': 5},
+        {'user_id': 'no-count', 'ai_queries_limit': 5, 'queries_reset_date': _next_month()},
+        {'user_id': 'active', 'ai_queries_count': 2, 'ai_queries_limit': 5, 'queries_reset_date': _next_month()},
+        {'user_id': 'due', 'ai_queries_count': 5, 'ai_queries_limit': 5,
+         'queries_reset_date': datetime.datetime(2000, 1, 1)}
+    )
+    monkeypatch.setattr(cosmos_driver, '_shared_client', {'users': {'mtgecorec_users': users}})
+    return users
+
+
+@pytest.fixture
+def manager(collection):
+    return UserManager()
+
+
+def test_reserve_refused_at_limit(manager, collection):
+    """A user at the limit is refused and their count is left unchanged"""
+    result = manager.reserve_ai_query('at-limit')
+
+    assert result['allowed'] is False
+    assert 'limit (5)' in result['reason']
+    assert result['reset_date'] == collection.docs['at-limit']['queries_reset_date']
+    assert collection.docs['at-limit']['ai_queries_count'] == 5
+
+
+def test_reserve_missing_quota_fields(manager, collection):
+    """Missing count and reset date are treated as a fresh quota"""
+    result = manager.reserve_ai_query('new')
+
+    assert result == {'allowed': True, 'remaining_queries': 4}
+    assert collection.docs['new']['ai_queries_count'] == 1
+    assert collection.docs['new']['queries_reset_date'] > datetime.datetime.utcnow()
+
+    # No reset due, so the missing count itself must read as zero
+    assert manager.reserve_ai_query('no-count') == {'allowed': True, 'remaining_queries': 4}
+    assert collection.docs['no-count']['ai_queries_count'] == 1
+
+
+def test_reserve_counts_query(manager, collection):
+    """remaining_queries already accounts for the query just reserved"""
+    assert manager.reserve_ai_query('active') == {'allowed': True, 'remaining_queries': 2}
+    assert collection.docs['active']['ai_queries_count'] == 3
+    assert manager.reserve_ai_query('active') == {'allowed': True, 'remaining_queries': 1}
+    assert manager.reserve_ai_query('active') == {'allowed': True, 'remaining_queries': 0}
+    assert manager.reserve_ai_query('active')['allowed'] is False
+    assert collection.docs['active']['ai_queries_count'] == 5
+
+
+def test_reserve_applies_due_reset(manager, collection):
+    """A passed reset date zeroes the count before the query is reserved"""
+    result = manager.reserve_ai_query('due')
+
+    assert result == {'allowed': True, 'remaining_queries': 4}
+    assert collection.docs['due']['ai_queries_count'] == 1
+    assert collection.docs['due']['queries_reset_date'] > datetime.datetime.utcnow()
+
+
+def test_reserve_unknown_user(manager):
+    """Unknown users are refused"""
+    assert manager.reserve_ai_query('missing') == {'allowed': False, 'reason': 'User not found'}
+
+
+def test_ai_query_required_reserves_quota(monkeypatch, manager, collection):
+    """The decorator reserves a query before running the view, or answers 429"""
+    from core.data_engine import auth_decorators
+    monkeypatch.setattr(auth_decorators, 'user_manager', manager)
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    calls = []
+
+    @auth_decorators.ai_query_required
+    def view():
+        calls.append(request.remaining_queries)
+        return 'ok'
+
+    with app.test_request_context(json={}):
+        session['user_id'] = 'active'
+        assert view().get_data(as_text=True) == 'ok'
+    assert calls == [2]
+    assert collection.docs['active']['ai_queries_count'] == 3
+
+    with app.test_request_context(json={}):
+        session['user_id'] = 'at-limit'
+        response, status = view()
+    assert status == 429
+    assert response.get_json()['quota_exceeded'] is True
+    assert calls == [2]
+    assert collection.docs['at-limit']['ai_queries_count'] == 5
+
+
+def test_ai_query_required_releases_failed_requests(monkeypatch, manager, collection):
+    """A view that errors or raises gives the reserved query back"""
+    from core.data_engine import auth_decorators
+    monkeypatch.setattr(auth_decorators, 'user_manager', manager)
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+
+    @auth_decorators.ai_query_required
+    def bad_request():
+        return {'error': 'Commander name required'}, 400
+
+    @auth_decorators.ai_query_required
+    def broken():
+        raise RuntimeError('engine failed')
+
+    with app.test_request_context(json={}):
+        session['user_id'] = 'active'
+        assert bad_request().status_code == 400
+    assert collection.docs['active']['ai_queries_count'] == 2
+
+    with app.test_request_context(json={}):
+        session['user_id'] = 'active'
+        with pytest.raises(RuntimeError):
+            broken()
+    assert collection.docs['active']['ai_queries_count'] == 2